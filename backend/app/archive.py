@@ -0,0 +1,115 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from sqlalchemy import select, insert, update, delete, literal, text
+from sqlalchemy.orm import Session
+from . import models, stats, events, dedup
+from .cache import code_cache
+from .database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Архивация выполненных задач: задачи со статусом "выполнена", не менявшиеся дольше
+# ARCHIVE_AFTER_DAYS, переносятся вместе с ответами в tasks_archive / responses_archive.
+# В tasks остаётся рабочий набор — по нему ходят список панели, статистика и sweeper.
+# Архив доступен по коду (GET /tasks/code/{code}) и в выгрузке (GET /tasks/export?archived=true).
+# Для панели и дельта-синхронизации перенос выглядит как удаление (tombstone + событие),
+# счётчики task_stats уменьшаются — статистика считает только рабочий набор.
+ARCHIVE_INTERVAL = float(os.getenv("ARCHIVE_INTERVAL", "3600"))  # сек, 0 — архивация выключена
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "180"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))
+
+_TASK_COLUMNS = tuple(column.name for column in models.TaskArchive.__table__.columns if column.name != "archived_at")
+_RESPONSE_COLUMNS = ("id", "request_id", "text", "sent_by", "sent_at")
+
+
+def _month(value: datetime) -> datetime:
+    return datetime(value.year, value.month, 1)
+
+
+def _next_month(value: datetime) -> datetime:
+    return datetime(value.year + value.month // 12, value.month % 12 + 1, 1)
+
+
+# Postgres: месячные секции архивных таблиц создаются по мере надобности
+def ensure_partitions(db: Session, months):
+    if db.get_bind().dialect.name != "postgresql":
+        return
+    for month in sorted(set(months)):
+        bounds = f"FROM ('{month:%Y-%m-%d}') TO ('{_next_month(month):%Y-%m-%d}')"
+        for table in ("tasks_archive", "responses_archive"):
+            db.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {table}_{month:%Y_%m} PARTITION OF {table} FOR VALUES {bounds}"
+            ))
+
+
+# Одна пачка: до batch_size задач, один commit. Возвращает число перенесённых задач.
+def archive_batch(db: Session, now: datetime = None, batch_size: int = ARCHIVE_BATCH_SIZE):
+    Task, Response = models.Task, models.Response
+    now = now or datetime.utcnow()
+    rows = db.execute(
+        select(Task.id, Task.code, Task.department, Task.type, Task.created_at, Task.deadline)
+        .where(Task.status == models.StatusEnum.done, Task.updated_at < now - timedelta(days=ARCHIVE_AFTER_DAYS))
+        .order_by(Task.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    ).all()
+    if not rows:
+        db.rollback()
+        return 0
+    ids = [row.id for row in rows]
+    ensure_partitions(db, (_month(row.created_at) for row in rows))
+
+    db.execute(insert(models.TaskArchive).from_select(
+        [*_TASK_COLUMNS, "archived_at"],
+        select(*(getattr(Task, name) for name in _TASK_COLUMNS), literal(now)).where(Task.id.in_(ids)),
+    ))
+    db.execute(insert(models.ResponseArchive).from_select(
+        [*_RESPONSE_COLUMNS, "task_created_at"],
+        select(*(getattr(Response, name) for name in _RESPONSE_COLUMNS), Task.created_at)
+        .join(Task, Task.id == Response.request_id)
+        .where(Response.request_id.in_(ids)),
+    ))
+    released = dedup.forget(db, ids)
+    # Как ON DELETE SET NULL у outbox.task_id (SQLite внешние ключи не проверяет)
+    db.execute(update(models.Outbox).where(models.Outbox.task_id.in_(ids)).values(task_id=None))
+    db.execute(delete(Response).where(Response.request_id.in_(ids)))
+    db.execute(delete(Task).where(Task.id.in_(ids)))
+
+    stats.bump_rows(db, rows, -1, models.StatusEnum.done)
+
+    # Для панели задача исчезла из списка: tombstone для ?since= и событие удаления
+    Tombstone = models.TaskTombstone
+    db.execute(delete(Tombstone).where(Tombstone.id.in_(ids)))  # SQLite может повторно выдавать id
+    db.execute(insert(Tombstone), [{"id": row.id, "code": row.code, "deleted_at": now} for row in rows])
+    for task_id in ids:
+        events.collect(db, "delete", task_id)
+    db.commit()
+    for code in [*(row.code for row in rows), *released]:
+        code_cache.invalidate(code)
+    return len(rows)
+
+
+def archive_done_tasks(now: datetime = None, batch_size: int = ARCHIVE_BATCH_SIZE):
+    total = 0
+    while True:
+        db = SessionLocal()
+        try:
+            moved = archive_batch(db, now, batch_size)
+        finally:
+            db.close()
+        total += moved
+        if moved < batch_size:
+            return total
+
+
+async def run_archiver(interval: float = ARCHIVE_INTERVAL):
+    while True:
+        try:
+            moved = await asyncio.to_thread(archive_done_tasks)
+            if moved:
+                logger.info("Archived %d done task(s)", moved)
+        except Exception:
+            logger.exception("Archiving failed")
+        await asyncio.sleep(interval)
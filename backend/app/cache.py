@@ -0,0 +1,120 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+# LRU-кэш с ограничением по числу записей и суммарному размеру значений (байты)
+class LRUCache:
+    def __init__(self, max_entries: int = 64, max_bytes: int = 32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()  # key -> (value, size)
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            self._data.move_to_end(key)
+            return item[0]
+
+    def set(self, key, value, size: int = 0):
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._size -= old[1]
+            if size > self.max_bytes:
+                return
+            self._data[key] = (value, size)
+            self._size += size
+            while len(self._data) > self.max_entries or self._size > self.max_bytes:
+                _, (_, evicted) = self._data.popitem(last=False)
+                self._size -= evicted
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._size = 0
+
+    def __len__(self):
+        return len(self._data)
+
+
+# Ограниченный кэш с временем жизни записей и счётчиками попаданий/промахов.
+# Поколения против гонки чтения с инвалидацией: читатель берёт generation() до чтения из БД
+# и передаёт его в set — если ключ за это время сбросили, устаревшее значение не кэшируется.
+# Номера сбросов хранятся для последних max_entries ключей; вытесненные поднимают общий порог.
+class TTLCache:
+    def __init__(self, ttl: float = 30.0, max_entries: int = 10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._epoch = 0  # номер последнего сброса
+        self._invalidated = OrderedDict()  # key -> номер его последнего сброса
+        self._floor = 0  # не меньше номера сброса любого вытесненного из _invalidated ключа
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] < time.monotonic():
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def generation(self, key):
+        with self._lock:
+            return self._epoch
+
+    def set(self, key, value, generation: int = None):
+        with self._lock:
+            if generation is not None and self._invalidated.get(key, self._floor) > generation:
+                return
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+            self._epoch += 1
+            self._invalidated[key] = self._epoch
+            self._invalidated.move_to_end(key)
+            while len(self._invalidated) > self.max_entries:
+                _, self._floor = self._invalidated.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._epoch += 1
+            self._invalidated.clear()
+            self._floor = self._epoch
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 3) if total else 0,
+            "size": len(self._data),
+        }
+
+    def __len__(self):
+        return len(self._data)
+
+
+# Ответы GET /tasks/code/{code} для бота; сбрасываются в crud при изменении задачи
+code_cache = TTLCache(
+    ttl=float(os.getenv("CODE_CACHE_TTL", "30")),
+    max_entries=int(os.getenv("CODE_CACHE_SIZE", "10000")),
+)
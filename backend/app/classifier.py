@@ -0,0 +1,208 @@
+import argparse
+import json
+import logging
+import math
+import os
+import threading
+import zlib
+from . import keywords
+
+logger = logging.getLogger(__name__)
+
+# Обученный классификатор отделов: хешированные TF-IDF признаки (основы слов и биграммы)
+# и мультиномиальный наивный Байес, сведённый к линейной модели scores = X @ W + b.
+# Артефакт — каталог с .npy-файлами; веса открываются через mmap, поэтому страницы
+# с весами общие для всех воркеров на машине. Модель решает только за обращения, для которых
+# ключевые слова не нашли отдела (keywords.match_department вернул бы отдел по умолчанию):
+# найденное ключевое слово не перебивается. Без модели (или без numpy) и при уверенности
+# ниже CLASSIFIER_THRESHOLD остаётся отдел по умолчанию.
+
+CLASSIFIER_MODEL_DIR = os.getenv("CLASSIFIER_MODEL_DIR")
+CLASSIFIER_THRESHOLD = float(os.getenv("CLASSIFIER_THRESHOLD", "0.6"))
+N_FEATURES = 2 ** 18
+
+
+def _features(text: str):
+    stems = keywords.normalize(text)
+    tokens = stems + [f"{a} {b}" for a, b in zip(stems, stems[1:])]
+    counts = {}
+    for token in tokens:
+        index = zlib.crc32(token.encode()) % N_FEATURES
+        counts[index] = counts.get(index, 0) + 1
+    return counts
+
+
+# CSR-представление пачки текстов: (indptr, indices, tf), tf = 1 + log(count)
+def _vectorize(texts):
+    import numpy as np
+    indptr, indices, data = [0], [], []
+    for text in texts:
+        counts = _features(text)
+        indices.extend(counts)
+        data.extend(1 + math.log(c) for c in counts.values())
+        indptr.append(len(indices))
+    return (
+        np.asarray(indptr, dtype=np.int64),
+        np.asarray(indices, dtype=np.int64),
+        np.asarray(data, dtype=np.float32),
+    )
+
+
+class DepartmentModel:
+    def __init__(self, path: str):
+        import numpy as np
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        self.labels = meta["labels"]
+        self.weights = np.load(os.path.join(path, "weights.npy"), mmap_mode="r")  # (N_FEATURES, классы)
+        self.idf = np.load(os.path.join(path, "idf.npy"), mmap_mode="r")
+        self.bias = np.load(os.path.join(path, "bias.npy"))
+
+    # Вероятности классов для пачки текстов: (len(texts), классы)
+    def predict_proba(self, texts):
+        import numpy as np
+        indptr, indices, tf = _vectorize(texts)
+        values = tf * self.idf[indices]
+        # L2-нормировка каждой строки
+        row_ids = np.repeat(np.arange(len(texts)), np.diff(indptr))
+        norms = np.sqrt(np.bincount(row_ids, weights=values * values, minlength=len(texts)))
+        values = values / np.maximum(norms[row_ids], 1e-12)
+
+        scores = np.tile(self.bias, (len(texts), 1)).astype(np.float64)
+        nonempty = np.flatnonzero(np.diff(indptr))
+        if len(nonempty):
+            contrib = self.weights[indices] * values[:, None]
+            scores[nonempty] += np.add.reduceat(contrib, indptr[nonempty], axis=0)
+        scores -= scores.max(axis=1, keepdims=True)
+        probs = np.exp(scores)
+        return probs / probs.sum(axis=1, keepdims=True)
+
+    def predict(self, texts):
+        probs = self.predict_proba(texts)
+        best = probs.argmax(axis=1)
+        return [(self.labels[i], float(probs[row, i])) for row, i in enumerate(best)]
+
+
+_model = None
+_loaded = False
+_lock = threading.Lock()
+
+
+def get_model():
+    global _model, _loaded
+    if not _loaded:
+        with _lock:
+            if not _loaded:
+                _model = _load()
+                _loaded = True
+    return _model
+
+
+# Модель из CLASSIFIER_MODEL_DIR или None (только ключевые слова). Причина отказа пишется в лог
+# один раз — битый артефакт не должен ронять создание задач
+def _load():
+    if not CLASSIFIER_MODEL_DIR:
+        return None
+    if not os.path.isdir(CLASSIFIER_MODEL_DIR):
+        logger.warning("CLASSIFIER_MODEL_DIR %s is not a directory: departments are matched by keywords only",
+                       CLASSIFIER_MODEL_DIR)
+        return None
+    try:
+        return DepartmentModel(CLASSIFIER_MODEL_DIR)
+    except ImportError:
+        logger.warning("numpy is not installed: departments are matched by keywords only")
+    except Exception:
+        logger.exception("Loading the classifier model from %s failed: departments are matched by keywords only",
+                         CLASSIFIER_MODEL_DIR)
+    return None
+
+
+# Вызывается при старте приложения: какой маршрутизатор отделов работает — видно в логах
+def log_backend():
+    model = get_model()
+    if model is not None:
+        logger.info("Department classifier: model from %s (%d departments), threshold %.2f",
+                    CLASSIFIER_MODEL_DIR, len(model.labels), CLASSIFIER_THRESHOLD)
+    else:
+        logger.info("Department classifier: keywords only")
+
+
+# Тот же интерфейс, что и keywords.match_department
+def match_department(text: str):
+    return match_departments([text])[0]
+
+
+def match_departments(texts):
+    texts = list(texts)
+    default = keywords.default_department()
+    departments = [candidates[0][0] if candidates else None for candidates in keywords.classify_many(texts)]
+    unmatched = [i for i, department in enumerate(departments) if department is None]
+    model = get_model() if unmatched else None
+    if model is not None:
+        predictions = model.predict([texts[i] for i in unmatched])
+        for i, (label, confidence) in zip(unmatched, predictions):
+            if confidence >= CLASSIFIER_THRESHOLD:
+                departments[i] = label
+    return [department or default for department in departments]
+
+
+# Обучение: тексты и отделы -> каталог с артефактом
+def train(texts, labels, out_dir: str, min_count: int = 5, alpha: float = 0.1):
+    import numpy as np
+    counts = {}
+    for label in labels:
+        counts[label] = counts.get(label, 0) + 1
+    classes = sorted(label for label, n in counts.items() if n >= min_count)
+    if len(classes) < 2:
+        raise ValueError("need at least two departments with enough examples")
+    class_index = {label: i for i, label in enumerate(classes)}
+    pairs = [(t, class_index[l]) for t, l in zip(texts, labels) if l in class_index]
+    texts = [t for t, _ in pairs]
+    y = np.asarray([c for _, c in pairs], dtype=np.int64)
+
+    indptr, indices, tf = _vectorize(texts)
+    row_ids = np.repeat(np.arange(len(texts)), np.diff(indptr))
+    df = np.bincount(indices, minlength=N_FEATURES).astype(np.float64)
+    idf = (np.log((1 + len(texts)) / (1 + df)) + 1).astype(np.float32)
+
+    values = tf * idf[indices]
+    norms = np.sqrt(np.bincount(row_ids, weights=values * values, minlength=len(texts)))
+    values = values / np.maximum(norms[row_ids], 1e-12)
+
+    # Мультиномиальный NB: log P(признак | класс) со сглаживанием alpha
+    feature_counts = np.zeros((N_FEATURES, len(classes)), dtype=np.float64)
+    np.add.at(feature_counts, (indices, y[row_ids]), values)
+    feature_counts += alpha
+    weights = np.log(feature_counts / feature_counts.sum(axis=0, keepdims=True)).astype(np.float32)
+    bias = np.log(np.bincount(y, minlength=len(classes)) / len(y)).astype(np.float64)
+
+    os.makedirs(out_dir, exist_ok=True)
+    np.save(os.path.join(out_dir, "weights.npy"), weights)
+    np.save(os.path.join(out_dir, "idf.npy"), idf)
+    np.save(os.path.join(out_dir, "bias.npy"), bias)
+    with open(os.path.join(out_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"labels": classes, "n_features": N_FEATURES, "documents": len(texts)}, f, ensure_ascii=False)
+    return classes
+
+
+def _train_from_db(out_dir: str, min_count: int):
+    from . import models
+    from .database import SessionLocal
+    db = SessionLocal()
+    try:
+        rows = db.query(models.Task.content, models.Task.department).all()
+    finally:
+        db.close()
+    classes = train([r.content for r in rows], [r.department for r in rows], out_dir, min_count)
+    print(f"Trained on {len(rows)} tasks, {len(classes)} departments -> {out_dir}")
+
+
+if __name__ == "__main__":
+    # python -m backend.app.classifier train --out models/departments
+    parser = argparse.ArgumentParser(description="Department classifier")
+    sub = parser.add_subparsers(dest="command", required=True)
+    train_cmd = sub.add_parser("train", help="train on tasks.content -> tasks.department")
+    train_cmd.add_argument("--out", required=True)
+    train_cmd.add_argument("--min-count", type=int, default=5)
+    args = parser.parse_args()
+    _train_from_db(args.out, args.min_count)
@@ -0,0 +1,84 @@
+import threading
+from datetime import datetime
+from sqlalchemy import select, update, insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from . import models
+
+# Номера кодов FM-<год>-<номер> выдаются из последовательности блоками по CODE_BLOCK_SIZE:
+# воркер резервирует блок одним nextval() и дальше раздаёт номера из памяти.
+# Шаг последовательности равен размеру блока, поэтому блоки разных воркеров не пересекаются.
+CODE_BLOCK_SIZE = models.CODE_BLOCK_SIZE
+
+
+def format_code(number: int, year: int = None) -> str:
+    return f"FM-{year or datetime.utcnow().year}-{number:04d}"
+
+
+class CodeAllocator:
+    block_size = CODE_BLOCK_SIZE  # не настраивается: совпадает с шагом последовательности и счётчика
+
+    def __init__(self):
+        self._next = 0
+        self._end = 0
+        self._lock = threading.Lock()
+
+    def allocate(self, db: Session, count: int = 1):
+        numbers = []
+        while len(numbers) < count:
+            with self._lock:
+                take = min(count - len(numbers), self._end - self._next)
+                if take > 0:
+                    numbers.extend(range(self._next, self._next + take))
+                    self._next += take
+                    continue
+            # Блок резервируется вне блокировки: в async-пути запрос к БД уступает цикл событий,
+            # и другой вызов из того же потока иначе навсегда встал бы на threading.Lock
+            start = self._reserve_block(db)
+            with self._lock:
+                if self._next >= self._end:
+                    self._next, self._end = start, start + self.block_size
+                    continue
+            # Пока ждали БД, общий блок пополнил другой вызов — берём номера из своего,
+            # остаток блока пропадает (пробел в номерах, уникальность сохраняется)
+            take = min(count - len(numbers), self.block_size)
+            numbers.extend(range(start, start + take))
+        return numbers
+
+    def _reserve_block(self, db: Session) -> int:
+        bind = db.get_bind()
+        if bind.dialect.name == "postgresql":
+            # nextval() не откатывается вместе с транзакцией — выданный блок не повторится
+            return db.execute(select(models.task_code_seq.next_value())).scalar_one()
+        return self._reserve_from_table(bind)
+
+    # Для SQLite и других БД без последовательностей — счётчик в таблице,
+    # в отдельной транзакции, чтобы откат запроса не вернул блок в оборот
+    def _reserve_from_table(self, bind) -> int:
+        Counter = models.CodeCounter
+        for _ in range(3):
+            try:
+                with bind.begin() as conn:
+                    value = conn.execute(
+                        update(Counter)
+                        .where(Counter.name == "task_code")
+                        .values(value=Counter.value + self.block_size)
+                        .returning(Counter.value)
+                    ).scalar()
+                    if value is None:
+                        conn.execute(insert(Counter).values(
+                            name="task_code", value=models.CODE_START + self.block_size,
+                        ))
+                        return models.CODE_START
+                    return value - self.block_size
+            except IntegrityError:
+                continue  # счётчик одновременно создал другой процесс
+        raise RuntimeError("could not reserve a block of task codes")
+
+
+allocator = CodeAllocator()
+
+
+def allocate_codes(db: Session, count: int = 1):
+    year = datetime.utcnow().year
+    return [format_code(number, year) for number in allocator.allocate(db, count)]
@@ -1,10 +1,11 @@
-from sqlalchemy.orm import Session
-from datetime import datetime
-import random
+from sqlalchemy.orm import Session, load_only, selectinload
+from datetime import datetime, timedelta
+import os
 from . import models, schemas
-from sqlalchemy import func
+from sqlalchemy import func, and_, or_, case, update, insert, select, delete, bindparam
 from sqlalchemy.orm import Session
-from . import models
+from . import models, utils, stats, codes, classifier, events, dedup, versions
+from .cache import code_cache
 
 def delete_complaint(db: Session, complaint_id: int):
     complaint = db.query(models.Complaint).filter(models.Complaint.id == complaint_id).first()
@@ -14,53 +15,397 @@ def delete_complaint(db: Session, complaint_id: int):
         return True
     return False
 
-# Генерация кода обращения: FM-2025-XXXX
-def generate_request_code():
-    year = datetime.utcnow().year
-    suffix = random.randint(1000, 9999)
-    return f"FM-{year}-{suffix}"
+# Генерация кода обращения: FM-2025-10001 (уникален, без повторных попыток)
+def generate_request_code(db: Session):
+    return codes.allocate_codes(db, 1)[0]
 
-# Создание задачи
-def create_task(db: Session, task: schemas.TaskCreate):
+# Создание задачи. signature — MinHash-подпись текста (dedup.signatures), посчитанная заранее вне
+# цикла событий; без неё считается здесь
+def create_task(db: Session, task: schemas.TaskCreate, signature=None):
     db_task = models.Task(
         content=task.content,
-        department=task.department,
+        department=task.department or classifier.match_department(task.content),
         deadline=task.deadline,
         telegram_id=task.telegram_id,
         username=task.username,
         full_name=task.full_name,
         type=task.type,
-        code=generate_request_code()
+        code=generate_request_code(db)
     )
     db.add(db_task)
+    db.flush()
+    # Почти-дубликат недавнего обращения — присоединяется к его кластеру
+    if signature is None:
+        signature = dedup.signatures([db_task.content])[0]
+    parent_id = dedup.link(db, [(db_task.id, signature, db_task.created_at)]).get(db_task.id)
+    if parent_id:
+        db_task.parent_id = parent_id
+    stats.bump_task(db, db_task, +1)
+    events.collect(db, "create", db_task.id, events.task_fields(db_task))
     db.commit()
     db.refresh(db_task)
     return db_task
 
-# Получение всех задач с обновлением просроченных
-def get_tasks(db: Session):
-    tasks = db.query(models.Task).all()
-    # Обновляем просроченные статусы
-    for task in tasks:
-        if task.status != models.StatusEnum.done and task.deadline < datetime.utcnow():
-            task.status = models.StatusEnum.overdue
+# Пакетное создание задач: коды выделяются блоком, вставка — многострочными INSERT,
+# один commit на пачку. Возвращает [(id, code)] в порядке входного списка.
+# signatures — подписи текстов (dedup.signatures) в том же порядке; без них считаются здесь.
+def create_tasks_bulk(db: Session, tasks: list, signatures: list = None):
+    Task = models.Task
+    now = datetime.utcnow()
+    # Отделы для строк без отдела — одним пакетным вызовом маршрутизатора
+    routed = iter(classifier.match_departments(task.content for task in tasks if not task.department))
+    rows = [
+        {
+            "content": task.content,
+            "department": task.department or next(routed),
+            "deadline": task.deadline,
+            "telegram_id": task.telegram_id,
+            "username": task.username,
+            "full_name": task.full_name,
+            "type": task.type or models.RequestType.complaint,
+            "status": models.StatusEnum.in_progress,
+            "created_at": now,
+            "updated_at": now,
+            "code": code,
+        }
+        for task, code in zip(tasks, codes.allocate_codes(db, len(tasks)))
+    ]
+    # Без sort_by_parameter_order: SQLite собирает строки в многострочные INSERT ... RETURNING,
+    # порядок возвращённых строк не гарантирован — id сопоставляются по уникальному коду
+    ids = dict(db.execute(insert(Task.__table__).returning(Task.code, Task.id), rows).all())
+    created = [(ids[row["code"]], row["code"]) for row in rows]
+
+    # Почти-дубликаты (в том числе внутри пачки) — parent_id одним executemany UPDATE
+    if signatures is None:
+        signatures = dedup.signatures(row["content"] for row in rows)
+    parents = dedup.link(db, [(task_id, sig, now) for sig, (task_id, _) in zip(signatures, created)], now)
+    if parents:
+        db.execute(
+            update(Task.__table__).where(Task.id == bindparam("task_id")).values(parent_id=bindparam("parent"), updated_at=now),
+            [{"task_id": task_id, "parent": parent} for task_id, parent in parents.items()],
+        )
+
+    # Счётчики — одним upsert'ом на (отдел, тип)
+    bumps = {}
+    for row in rows:
+        key = (row["department"], row["type"])
+        count, hours = bumps.get(key, (0, 0.0))
+        bumps[key] = (count + 1, hours + stats.hours_span(now, row["deadline"]))
+    for (department, type), (count, hours) in bumps.items():
+        stats.bump(db, department, models.StatusEnum.in_progress, type, count, hours)
+    for row, (task_id, _) in zip(rows, created):
+        events.collect(db, "create", task_id, events.row_fields({**row, "id": task_id, "parent_id": parents.get(task_id)}))
     db.commit()
-    return tasks
+    return created
+
+# Фильтры списка задач (отдел, статус, тип, диапазоны дат, префикс кода)
+def _filter_tasks(query, filters: schemas.TaskFilter, model=models.Task):
+    Task = model
+    if filters.department:
+        query = query.filter(Task.department == filters.department)
+    if filters.status:
+        query = query.filter(Task.status == filters.status)
+    if filters.type:
+        query = query.filter(Task.type == filters.type)
+    if filters.created_from:
+        query = query.filter(Task.created_at >= filters.created_from)
+    if filters.created_to:
+        query = query.filter(Task.created_at < filters.created_to)
+    if filters.deadline_from:
+        query = query.filter(Task.deadline >= filters.deadline_from)
+    if filters.deadline_to:
+        query = query.filter(Task.deadline < filters.deadline_to)
+    if filters.code_prefix:
+        query = query.filter(Task.code.startswith(filters.code_prefix, autoescape=True))
+    if filters.telegram_id:
+        query = query.filter(Task.telegram_id == filters.telegram_id)
+    if filters.cluster_id:
+        query = query.filter(or_(Task.id == filters.cluster_id, Task.parent_id == filters.cluster_id))
+    return query
+
+# Колонки для schemas.TaskSummaryOut
+SUMMARY_COLUMNS = (
+    models.Task.id, models.Task.code, models.Task.content, models.Task.department,
+    models.Task.status, models.Task.type, models.Task.created_at, models.Task.updated_at, models.Task.deadline,
+    models.Task.telegram_id, models.Task.reply, models.Task.parent_id,
+)
+
+# Страница задач с keyset-курсором по (created_at, id), новые сверху.
+# after — декодированный курсор (created_at, id) последней строки предыдущей страницы.
+# include_responses=True подгружает ответы одним запросом (selectin) вместо запроса на задачу.
+def get_tasks(db: Session, filters: schemas.TaskFilter = None, after=None, limit: int = 50,
+              include_responses: bool = False):
+    Task = models.Task
+    if include_responses:
+        query = db.query(Task).options(selectinload(Task.responses))
+    else:
+        query = db.query(Task).options(load_only(*SUMMARY_COLUMNS))
+    query = _filter_tasks(query, filters or schemas.TaskFilter())
+    if after:
+        query = query.filter(_older_than(after))
+    # Берём на одну строку больше, чтобы понять, есть ли следующая страница
+    tasks = query.order_by(Task.created_at.desc(), Task.id.desc()).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(tasks) > limit:
+        tasks = tasks[:limit]
+        next_cursor = utils.encode_cursor(tasks[-1].created_at, tasks[-1].id)
+
+    return tasks, next_cursor
+
+def _older_than(after, model=models.Task):
+    Task = model
+    created_at, task_id = after
+    return or_(Task.created_at < created_at, and_(Task.created_at == created_at, Task.id < task_id))
+
+# Строки для ответов API словарями прямо из кортежей колонок — без ORM-объектов
+# и pydantic-валидации (данные из своей БД). Ключи и их порядок — как у TaskSummaryOut / TaskOut,
+# кодирует fastjson, поэтому ответ совпадает с прежним побайтно.
+SUMMARY_FIELDS = tuple(schemas.TaskSummaryOut.model_fields)
+FULL_FIELDS = tuple(name for name in schemas.TaskOut.model_fields if name != "responses")
+RESPONSE_FIELDS = tuple(schemas.ResponseOut.model_fields)
+
+def _select_fields(model, fields):
+    return select(*(getattr(model, name) for name in fields))
+
+# Ответы для пачки задач одним запросом (как selectinload), в порядке id
+def _attach_responses(db: Session, items: list, model=models.Response):
+    by_task = {item["id"]: item for item in items}
+    for item in items:
+        item["responses"] = []
+    if not by_task:
+        return items
+    rows = db.execute(
+        _select_fields(model, RESPONSE_FIELDS)
+        .where(model.request_id.in_(by_task))
+        .order_by(model.id)
+    ).all()
+    for row in rows:
+        by_task[row.request_id]["responses"].append(dict(zip(RESPONSE_FIELDS, row)))
+    return items
+
+# То же, что get_tasks, но строками-словарями: ({"items": [...], "next_cursor": ...}).
+# archived=True — те же страницы из архива (tasks_archive / responses_archive)
+def get_task_rows(db: Session, filters: schemas.TaskFilter = None, after=None, limit: int = 50,
+                  include_responses: bool = False, archived: bool = False):
+    Task = models.TaskArchive if archived else models.Task
+    fields = FULL_FIELDS if include_responses else SUMMARY_FIELDS
+    query = _filter_tasks(_select_fields(Task, fields), filters or schemas.TaskFilter(), Task)
+    if after:
+        query = query.where(_older_than(after, Task))
+    rows = db.execute(query.order_by(Task.created_at.desc(), Task.id.desc()).limit(limit + 1)).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = utils.encode_cursor(rows[-1].created_at, rows[-1].id)
+    items = [dict(zip(fields, row)) for row in rows]
+    if include_responses:
+        _attach_responses(db, items, models.ResponseArchive if archived else models.Response)
+    return {"items": items, "next_cursor": next_cursor}
+
+# Дельта-синхронизация (GET /tasks?since=): строки с (version, id) после токена и id задач,
+# удалённых после него. Номера версий видны в порядке commit'ов (versions.py) — токен не
+# пропускает транзакции, закоммиченные позже соседей, и строки не повторяются.
+TOMBSTONE_RETENTION_DAYS = int(os.getenv("TOMBSTONE_RETENTION_DAYS", "30"))
+
+
+class SyncExpired(Exception):
+    """Токен старше хранимых tombstones — клиенту нужна полная перезагрузка"""
+
+
+def get_changes(db: Session, since=None, limit: int = 500):
+    Task, Tombstone = models.Task, models.TaskTombstone
+    if since and since[0] < versions.pruned(db):
+        raise SyncExpired()
+    # Версия до выборки: всё, что она покрывает, уже закоммичено и попадёт в выборку
+    current, _ = versions.current(db)
+    query = _select_fields(Task, (*SUMMARY_FIELDS, "version"))  # version — последним, в items не попадает
+    if since:
+        version, task_id = since
+        query = query.where(or_(
+            Task.version > version,
+            and_(Task.version == version, Task.id > task_id),
+        ))
+    tasks = db.execute(query.order_by(Task.version, Task.id).limit(limit + 1)).all()
+    has_more = len(tasks) > limit
+    tasks = tasks[:limit]
+
+    deleted = db.query(Tombstone.id)
+    if since:
+        deleted = deleted.filter(Tombstone.version > since[0])
+    if has_more:
+        deleted = deleted.filter(Tombstone.version <= tasks[-1].version)
+
+    end = (tasks[-1].version, tasks[-1].id) if tasks else since or (0, 0)
+    if not has_more:
+        end = max(end, (current, 0))  # версии без строк tasks (только удаления) тоже пройдены
+    # Формат schemas.TaskDelta
+    return {
+        "items": [dict(zip(SUMMARY_FIELDS, row)) for row in tasks],
+        "deleted": [task_id for task_id, in deleted.all()],
+        "next_since": utils.encode_since(*end),
+        "has_more": has_more,
+    }
+
+# Версия данных для ETag/Last-Modified и кэша PDF: (номер, время) из versions.py
+def get_data_version(db: Session):
+    return versions.current(db)
+
+def prune_tombstones(db: Session, now: datetime = None):
+    Tombstone = models.TaskTombstone
+    now = now or datetime.utcnow()
+    expired = Tombstone.deleted_at < now - timedelta(days=TOMBSTONE_RETENTION_DAYS)
+    newest = db.scalar(select(func.max(Tombstone.version)).where(expired))
+    if newest is None:
+        db.rollback()
+        return 0
+    removed = db.query(Tombstone).filter(expired).delete(synchronize_session=False)
+    versions.mark_pruned(db, newest)
+    db.commit()
+    return removed
+
+# Перевод просроченных задач в статус "просрочена" одним UPDATE.
+# Вызывается фоновым sweeper'ом, возвращает число изменённых строк.
+def mark_overdue_tasks(db: Session, now: datetime = None):
+    Task, Status = models.Task, models.StatusEnum
+    now = now or datetime.utcnow()
+    rows = db.execute(
+        update(Task)
+        .where(Task.status == Status.in_progress, Task.deadline < now)
+        .values(status=Status.overdue)
+        .returning(Task.id, Task.code, Task.department, Task.type, Task.created_at, Task.deadline)
+        .execution_options(synchronize_session=False)
+    ).all()
+
+    # Переносим счётчики пачкой: одна пара bump'ов на (отдел, тип)
+    stats.bump_rows(db, rows, -1, Status.in_progress)
+    stats.bump_rows(db, rows, +1, Status.overdue)
+    for row in rows:
+        events.collect(db, "update", row.id, {"status": Status.overdue.value})
+    db.commit()
+    for row in rows:
+        code_cache.invalidate(row.code)
+    return len(rows)
+
+# Получение задачи по id
+def get_task(db: Session, task_id: int):
+    return db.query(models.Task).filter(models.Task.id == task_id).first()
 
-# Получение задачи по коду
+# Получение задачи по коду; не нашлась в рабочей таблице — ищем в архиве
 def get_task_by_code(db: Session, code: str):
-    return db.query(models.Task).filter(models.Task.code == code).first()
+    task = db.query(models.Task).filter(models.Task.code == code).first()
+    if task is None:
+        task = get_archived_task_by_code(db, code)
+    return task
+
+# Архивная задача словарём в формате TaskOut (с ответами)
+def get_archived_task_by_code(db: Session, code: str):
+    row = db.execute(
+        _select_fields(models.TaskArchive, FULL_FIELDS).where(models.TaskArchive.code == code).limit(1)
+    ).first()
+    if row is None:
+        return None
+    return _attach_responses(db, [dict(zip(FULL_FIELDS, row))], models.ResponseArchive)[0]
 
 # Обновление статуса задачи
 def update_task_status(db: Session, task_id: int, status: schemas.TaskUpdate):
-    task = db.query(models.Task).filter(models.Task.id == task_id).first()
+    task = db.query(models.Task).filter(models.Task.id == task_id).with_for_update().first()
     if not task:
         return None
+    if task.status != status.status:
+        stats.bump_task(db, task, -1)
+        stats.bump_task(db, task, +1, status=status.status)
     task.status = status.status
+    events.collect(db, "update", task.id, {"status": task.status.value})
     db.commit()
+    code_cache.invalidate(task.code)
     db.refresh(task)
     return task
 
+# Удаление задачи
+def delete_task(db: Session, task_id: int):
+    task = db.query(models.Task).filter(models.Task.id == task_id).with_for_update().first()
+    if not task:
+        return False
+    stats.bump_task(db, task, -1)
+    code = task.code
+    released = dedup.forget(db, [task_id])
+    db.query(models.Response).filter(models.Response.request_id == task_id).delete(synchronize_session=False)
+    db.delete(task)
+    # merge: SQLite может повторно выдать id последней удалённой строки
+    db.merge(models.TaskTombstone(id=task_id, code=code, deleted_at=datetime.utcnow()))
+    events.collect(db, "delete", task_id)
+    db.commit()
+    for code in [code, *released]:
+        code_cache.invalidate(code)
+    return True
+
+# Пакетные операции (PATCH/DELETE /tasks/bulk): задачи по списку id или по фильтру,
+# в одной транзакции, запросами над множествами строк (IN-списки — пачками по BULK_ID_CHUNK).
+BULK_ID_CHUNK = 5000
+
+def _chunks(ids):
+    return (ids[i:i + BULK_ID_CHUNK] for i in range(0, len(ids), BULK_ID_CHUNK))
+
+def _selection(selection: schemas.TaskSelection):
+    if selection.ids is not None:
+        return models.Task.id.in_(selection.ids)
+    return _filter_tasks(select(models.Task.id), selection.filter).whereclause
+
+# Смена статуса: по одному UPDATE ... RETURNING на каждый прежний статус (их не больше двух) —
+# прежний статус известен без отдельного чтения, счётчики переносятся пачкой
+def update_tasks_status_bulk(db: Session, selection: schemas.TaskSelection, status: models.StatusEnum):
+    Task = models.Task
+    condition = _selection(selection)
+    changed = []
+    for old in models.StatusEnum:
+        if old == status:
+            continue
+        rows = db.execute(
+            update(Task)
+            .where(condition, Task.status == old)
+            .values(status=status)
+            .returning(Task.id, Task.code, Task.department, Task.type, Task.created_at, Task.deadline)
+            .execution_options(synchronize_session=False)
+        ).all()
+        stats.bump_rows(db, rows, -1, old)
+        stats.bump_rows(db, rows, +1, status)
+        changed.extend(rows)
+    for row in changed:
+        events.collect(db, "update", row.id, {"status": status.value})
+    db.commit()
+    for row in changed:
+        code_cache.invalidate(row.code)
+    return {"updated": len(changed)}
+
+# Удаление с ответами: строки блокируются, затем responses, outbox (task_id -> NULL) и tasks
+# удаляются по списку id — задача, подошедшая под фильтр позже, не затронет счётчики
+def delete_tasks_bulk(db: Session, selection: schemas.TaskSelection):
+    Task, Response, Tombstone = models.Task, models.Response, models.TaskTombstone
+    rows = db.execute(
+        select(Task.id, Task.code, Task.department, Task.status, Task.type, Task.created_at, Task.deadline)
+        .where(_selection(selection))
+        .with_for_update()
+    ).all()
+    responses = 0
+    now = datetime.utcnow()
+    released = dedup.forget(db, [row.id for row in rows])
+    for ids in _chunks([row.id for row in rows]):
+        responses += db.execute(delete(Response).where(Response.request_id.in_(ids))).rowcount
+        db.execute(update(models.Outbox).where(models.Outbox.task_id.in_(ids)).values(task_id=None))
+        db.execute(delete(Task).where(Task.id.in_(ids)))
+        db.execute(delete(Tombstone).where(Tombstone.id.in_(ids)))  # SQLite может повторно выдавать id
+    if rows:
+        db.execute(insert(Tombstone), [{"id": row.id, "code": row.code, "deleted_at": now} for row in rows])
+    stats.bump_rows(db, rows, -1)
+    for row in rows:
+        events.collect(db, "delete", row.id)
+    db.commit()
+    for code in [*(row.code for row in rows), *released]:
+        code_cache.invalidate(code)
+    return {"deleted": len(rows), "responses_deleted": responses}
+
 # Сохранение ответа на задачу
 def save_reply(db: Session, task_id: int, text: str, moderator_name: str = "Модератор"):
     task = db.query(models.Task).filter(models.Task.id == task_id).first()
@@ -74,52 +419,116 @@ def save_reply(db: Session, task_id: int, text: str, moderator_name: str = "Мо
     )
     task.reply = text  # для отображения в таблице
     db.add(reply)
+    if task.telegram_id:
+        # Отправит фоновый диспетчер outbox.py после коммита
+        db.add(models.Outbox(
+            task_id=task.id,
+            chat_id=task.telegram_id,
+            text=f"📢 Ответ на ваше обращение:\n\n{text}",
+        ))
+    code = task.code
+    events.collect(db, "update", task.id, {"reply": text})
     db.commit()
+    code_cache.invalidate(code)
     return reply
 
-# Получение статистики по всем задачам
-def get_task_stats(db: Session):
-    total = db.query(models.Task).count()
-    done = db.query(models.Task).filter(models.Task.status == models.StatusEnum.done).count()
-    in_progress = db.query(models.Task).filter(models.Task.status == models.StatusEnum.in_progress).count()
-    overdue = db.query(models.Task).filter(models.Task.status == models.StatusEnum.overdue).count()
-
+# Кластеры почти-дубликатов (dedup.py): корневые задачи с числом присоединённых обращений,
+# сначала пополнявшиеся последними. status — статус корня. Формат schemas.ClusterPage.
+def get_clusters(db: Session, status: models.StatusEnum = None, limit: int = 50, offset: int = 0):
+    Task = models.Task
+    children = (
+        select(Task.parent_id, func.count().label("duplicates"), func.max(Task.created_at).label("last_at"))
+        .where(Task.parent_id.is_not(None))
+        .group_by(Task.parent_id)
+        .subquery()
+    )
+    query = (
+        _select_fields(Task, SUMMARY_FIELDS)
+        .add_columns(children.c.duplicates, children.c.last_at)
+        .join(children, children.c.parent_id == Task.id)
+    )
+    if status:
+        query = query.where(Task.status == status)
+    rows = db.execute(
+        query.order_by(children.c.last_at.desc(), Task.id.desc()).offset(offset).limit(limit + 1)
+    ).all()
     return {
-        "total": total,
-        "done": done,
-        "in_progress": in_progress,
-        "overdue": overdue,
+        "items": [
+            {"task": dict(zip(SUMMARY_FIELDS, row)), "duplicates": row.duplicates, "last_at": row.last_at}
+            for row in rows[:limit]
+        ],
+        "next_offset": offset + limit if len(rows) > limit else None,
     }
 
-# Получение детализированной статистики по каждому отделу
-def get_detailed_stats(db: Session):
-    departments = db.query(models.Task.department).distinct().all()  # Получаем уникальные отделы
-    stats = {}
-
-    for dept_obj in departments:
-        dept = dept_obj[0]
-        q = db.query(models.Task).filter(models.Task.department == dept)
-
-        total = q.count()
-        done = q.filter(models.Task.status == models.StatusEnum.done).count()
-        in_progress = q.filter(models.Task.status == models.StatusEnum.in_progress).count()
-        overdue = q.filter(models.Task.status == models.StatusEnum.overdue).count()
-
-        # Вычисление средней продолжительности выполнения задач
-        durations = []
-        for task in q.filter(models.Task.status == models.StatusEnum.done):  # Только выполненные задачи
-            if task.created_at and task.deadline:
-                hours = (task.deadline - task.created_at).total_seconds() / 3600
-                durations.append(hours)
-
-        avg_hours = round(sum(durations) / len(durations), 1) if durations else 0
-
-        stats[dept] = {
-            "total": total,
-            "done": done,
-            "in_progress": in_progress,
-            "overdue": overdue,
-            "avg_hours": avg_hours
-        }
+def _cluster(parent_id: int):
+    return schemas.TaskSelection(filter=schemas.TaskFilter(cluster_id=parent_id))
+
+# Смена статуса всего кластера (корень и дубликаты); None — корня нет
+def update_cluster_status(db: Session, parent_id: int, status: models.StatusEnum):
+    if get_task(db, parent_id) is None:
+        return None
+    return update_tasks_status_bulk(db, _cluster(parent_id), status)
+
+# Один ответ всему кластеру: запись в responses у каждой задачи и сообщение в outbox
+# каждому автору из Telegram. None — корня нет.
+def save_cluster_reply(db: Session, parent_id: int, text: str, moderator_name: str = "Модератор"):
+    Task = models.Task
+    rows = db.execute(
+        update(Task)
+        .where(_selection(_cluster(parent_id)))
+        .values(reply=text)
+        .returning(Task.id, Task.code, Task.telegram_id)
+        .execution_options(synchronize_session=False)
+    ).all()
+    if not rows:
+        db.rollback()
+        return None
+    now = datetime.utcnow()
+    db.execute(insert(models.Response), [
+        {"request_id": row.id, "text": text, "sent_by": moderator_name, "sent_at": now} for row in rows
+    ])
+    notify = [row for row in rows if row.telegram_id]
+    if notify:
+        # Отправит фоновый диспетчер outbox.py после коммита
+        db.execute(insert(models.Outbox), [
+            {"task_id": row.id, "chat_id": row.telegram_id, "text": f"📢 Ответ на ваше обращение:\n\n{text}"}
+            for row in notify
+        ])
+    for row in rows:
+        events.collect(db, "update", row.id, {"reply": text})
+    db.commit()
+    for row in rows:
+        code_cache.invalidate(row.code)
+    return {"replied": len(rows), "notified": len(notify)}
 
-    return stats
+# Получение статистики по всем задачам (из счётчиков task_stats)
+def get_task_stats(db: Session):
+    return stats.get_task_stats(db)
+
+# Получение детализированной статистики по каждому отделу.
+# Без фильтров — из счётчиков; с фильтрами (отдел, период) — один GROUP BY по tasks.
+def get_detailed_stats(db: Session, filters: schemas.TaskFilter = None):
+    if filters is None or not filters.model_dump(exclude_none=True):
+        return stats.get_detailed_stats(db)
+
+    Task, Status = models.Task, models.StatusEnum
+    hours = stats.hours_between(db, Task.created_at, Task.deadline)
+    query = db.query(
+        Task.department,
+        func.count(Task.id).label("total"),
+        func.count(case((Task.status == Status.done, 1))).label("done"),
+        func.count(case((Task.status == Status.in_progress, 1))).label("in_progress"),
+        func.count(case((Task.status == Status.overdue, 1))).label("overdue"),
+        func.avg(case((Task.status == Status.done, hours))).label("avg_hours"),
+    )
+    rows = _filter_tasks(query, filters).group_by(Task.department).all()
+    return {
+        row.department: {
+            "total": row.total,
+            "done": row.done,
+            "in_progress": row.in_progress,
+            "overdue": row.overdue,
+            "avg_hours": round(row.avg_hours, 1) if row.avg_hours is not None else 0,
+        }
+        for row in rows
+    }
@@ -0,0 +1,45 @@
+import functools
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import crud
+
+# Асинхронные варианты функций crud для обработчиков на AsyncSession.
+# Каждая функция выполняется целиком через AsyncSession.run_sync: запросы уходят
+# в asyncpg/aiosqlite без блокировки потока, а логика crud остаётся в одном месте.
+# schema=... превращает результат в pydantic-модель внутри run_sync — ленивые связи
+# (например, Task.responses) нельзя подгружать после выхода из него.
+
+
+def _async(fn):
+    @functools.wraps(fn)
+    async def wrapper(db: AsyncSession, *args, schema=None, **kwargs):
+        def call(session):
+            result = fn(session, *args, **kwargs)
+            if schema is not None and result is not None:
+                return schema.model_validate(result)
+            return result
+        return await db.run_sync(call)
+    return wrapper
+
+
+delete_complaint = _async(crud.delete_complaint)
+generate_request_code = _async(crud.generate_request_code)
+create_task = _async(crud.create_task)
+create_tasks_bulk = _async(crud.create_tasks_bulk)
+get_tasks = _async(crud.get_tasks)
+get_task_rows = _async(crud.get_task_rows)
+get_changes = _async(crud.get_changes)
+get_data_version = _async(crud.get_data_version)
+prune_tombstones = _async(crud.prune_tombstones)
+mark_overdue_tasks = _async(crud.mark_overdue_tasks)
+get_task = _async(crud.get_task)
+get_task_by_code = _async(crud.get_task_by_code)
+update_task_status = _async(crud.update_task_status)
+delete_task = _async(crud.delete_task)
+update_tasks_status_bulk = _async(crud.update_tasks_status_bulk)
+delete_tasks_bulk = _async(crud.delete_tasks_bulk)
+save_reply = _async(crud.save_reply)
+get_clusters = _async(crud.get_clusters)
+update_cluster_status = _async(crud.update_cluster_status)
+save_cluster_reply = _async(crud.save_cluster_reply)
+get_task_stats = _async(crud.get_task_stats)
+get_detailed_stats = _async(crud.get_detailed_stats)
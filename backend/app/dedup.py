@@ -0,0 +1,252 @@
+import hashlib
+import logging
+import os
+import random
+import re
+import struct
+import zlib
+from datetime import datetime, timedelta
+from sqlalchemy import select, insert, update, delete, func, bindparam
+from sqlalchemy.orm import Session
+from . import models, keywords, events
+
+logger = logging.getLogger(__name__)
+
+# Почти-дубликаты при приёме обращений (POST /tasks — им пользуется бот, POST /tasks/bulk).
+# Текст приводится к основам слов (keywords.normalize); множество основ и пар соседних основ
+# сворачивается в MinHash-подпись из NUM_PERM чисел. Подпись режется на BANDS полос по ROWS чисел,
+# хэш полосы — LSH-корзина. Кандидаты — задачи хотя бы с одной общей корзиной: поиск по первичному
+# ключу task_lsh_buckets, время не зависит от размера tasks. Кандидат принимается, если доля
+# совпавших чисел подписи (оценка сходства Жаккара) не ниже DEDUP_THRESHOLD.
+# Дубликат получает parent_id корневой задачи кластера. В индексе только корни — кластер занимает
+# одну запись в корзине; выполненные корни и корни старше DEDUP_WINDOW_DAYS кандидатами не считаются.
+# Подписи считаются до обращения к БД (signatures, в пуле потоков — не в цикле событий) и передаются
+# в link; перестановки — одной операцией numpy над всеми хэшами пачки (без numpy — тот же результат циклом).
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "1") == "1"
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.6"))
+DEDUP_WINDOW_DAYS = int(os.getenv("DEDUP_WINDOW_DAYS", "14"))
+
+NUM_PERM = 64
+BANDS, ROWS = 16, 4  # пара со сходством 0.6 становится кандидатом с вероятностью 0.89, 0.8 — 0.9996
+_MIN_STEMS = 3  # меньше разных слов — сходству не на чем держаться
+# Перестановки (a*h + b) mod p: при p < 2^31 произведение помещается в uint64 — numpy считает точно
+_PRIME = (1 << 31) - 1
+_rng = random.Random(7_202_405)  # перестановки фиксированы: подписи сравнимы между перезапусками
+_PERMS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+_NUMPY_BATCH = 256  # текстов на одну матрицу (NUM_PERM x хэшей): память ограничена
+_PACK = struct.Struct(f"<{NUM_PERM}I")
+_CHUNK = 2000  # размер IN-списков
+# Postgres: advisory-блокировки по корзинам (ключ из двух int — не пересекается с блокировкой миграций)
+_LOCK_NAMESPACE = 7_202_425
+_LOCK_SLOTS = 1024  # корзины сводятся к слотам: не больше _LOCK_SLOTS блокировок на транзакцию
+
+# Тема в квадратных скобках и строки вложений от бота (фото, геолокация) — не текст жалобы
+_NOISE_RE = re.compile(r"^\s*\[[^\]]*\]|^.*(?:📷|📍).*$|<[^>]+>|https?://\S+", re.MULTILINE)
+
+
+def shingles(text: str):
+    stems = keywords.normalize(_NOISE_RE.sub(" ", text or ""))
+    if len(set(stems)) < _MIN_STEMS:
+        return set()
+    return set(stems) | {f"{a} {b}" for a, b in zip(stems, stems[1:])}
+
+
+def _hashes(text: str):
+    return [zlib.crc32(s.encode()) % _PRIME for s in shingles(text)]
+
+
+_np = None
+
+
+def _numpy():
+    global _np
+    if _np is None:
+        try:
+            import numpy
+            _np = numpy
+        except ImportError:
+            logger.warning("numpy is not installed: near-duplicate signatures use the pure Python fallback")
+            _np = False
+    return _np or None
+
+
+def _minhash(hashes):
+    return tuple(min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMS)
+
+
+def _minhash_many(hash_lists):
+    np = _numpy()
+    if np is None:
+        return [_minhash(hashes) for hashes in hash_lists]
+    a = np.array([a for a, _ in _PERMS], dtype=np.uint64)[:, None]
+    b = np.array([b for _, b in _PERMS], dtype=np.uint64)[:, None]
+    result = []
+    for i in range(0, len(hash_lists), _NUMPY_BATCH):
+        batch = hash_lists[i:i + _NUMPY_BATCH]
+        flat = np.fromiter((h for hashes in batch for h in hashes), dtype=np.uint64)
+        starts = np.cumsum([0] + [len(hashes) for hashes in batch[:-1]])
+        values = (a * flat[None, :] + b) % _PRIME  # (NUM_PERM, все хэши пачки)
+        result.extend(map(tuple, np.minimum.reduceat(values, starts, axis=1).T.tolist()))
+    return result
+
+
+# MinHash-подпись (NUM_PERM чисел) или None для слишком короткого текста
+def signature(text: str):
+    return signatures([text], enabled=True)[0]
+
+
+# Подписи пачки текстов (None — текст короткий или поиск дубликатов выключен).
+# Чистый CPU без обращения к БД: вызывать вне цикла событий и до транзакции создания
+def signatures(texts, enabled: bool = None):
+    texts = list(texts)
+    if not (DEDUP_ENABLED if enabled is None else enabled):
+        return [None] * len(texts)
+    hash_lists = [_hashes(text) for text in texts]
+    nonempty = [i for i, hashes in enumerate(hash_lists) if hashes]
+    result = [None] * len(texts)
+    for i, sig in zip(nonempty, _minhash_many([hash_lists[i] for i in nonempty])):
+        result[i] = sig
+    return result
+
+
+# Корзины подписи: хэш каждой полосы вместе с её номером — одна колонка на все полосы
+def buckets(sig):
+    packed = _PACK.pack(*sig)
+    size = ROWS * 4
+    return {
+        int.from_bytes(
+            hashlib.blake2b(bytes([band]) + packed[band * size:(band + 1) * size], digest_size=8).digest(),
+            "little", signed=True,
+        )
+        for band in range(BANDS)
+    }
+
+
+def similarity(a, b) -> float:
+    return sum(x == y for x, y in zip(a, b)) / NUM_PERM
+
+
+# Проверка кандидатов и вставка корня должны идти по очереди: иначе две похожие жалобы,
+# созданные одновременно, не видят друг друга и обе становятся корнями. В Postgres транзакция
+# берёт advisory-блокировки на слоты своих корзин (в порядке возрастания — без взаимоблокировок)
+# до commit; похожая жалоба ждёт её и затем видит новый корень. В SQLite транзакция создания
+# уже держит блокировку записи после INSERT задачи — параллельных писателей нет.
+def _lock_buckets(db: Session, task_buckets):
+    if db.get_bind().dialect.name != "postgresql":
+        return
+    for slot in sorted({bucket % _LOCK_SLOTS for bucket in task_buckets}):
+        db.execute(select(func.pg_advisory_xact_lock(_LOCK_NAMESPACE, slot)))
+
+
+# Привязать новые задачи к кластерам. items — [(id, подпись из signatures, created_at)] в порядке
+# создания, вызывается в транзакции создания до commit. Возвращает {id: parent_id} для дубликатов;
+# остальные задачи становятся корнями и попадают в индекс (дубликаты внутри пачки тоже находятся).
+def link(db: Session, items, now: datetime = None):
+    if not DEDUP_ENABLED:
+        return {}
+    Task, Signature, Bucket = models.Task, models.TaskSignature, models.TaskLshBucket
+    now = now or datetime.utcnow()
+    prepared = [
+        (task_id, created_at, sig, buckets(sig)) for task_id, sig, created_at in items if sig is not None
+    ]
+    if not prepared:
+        return {}
+
+    # Корни из общих корзин: не выполненные и в пределах окна
+    wanted = sorted({bucket for *_, task_buckets in prepared for bucket in task_buckets})
+    _lock_buckets(db, wanted)
+    members, known = {}, {}  # корзина -> [id корня], id корня -> подпись
+    for i in range(0, len(wanted), _CHUNK):
+        rows = db.execute(
+            select(Bucket.bucket, Bucket.task_id, Signature.signature)
+            .join(Signature, Signature.task_id == Bucket.task_id)
+            .join(Task, Task.id == Bucket.task_id)
+            .where(
+                Bucket.bucket.in_(wanted[i:i + _CHUNK]),
+                Signature.created_at >= now - timedelta(days=DEDUP_WINDOW_DAYS),
+                Task.status != models.StatusEnum.done,
+            )
+        ).all()
+        for row in rows:
+            members.setdefault(row.bucket, []).append(row.task_id)
+            known[row.task_id] = _PACK.unpack(row.signature)
+
+    linked, roots, root_buckets = {}, [], []
+    for task_id, created_at, sig, task_buckets in prepared:
+        candidates = {root for bucket in task_buckets for root in members.get(bucket, ())}
+        scored = [(similarity(sig, known[root]), -root) for root in candidates]
+        best = max(scored, default=None)  # при равном сходстве — более ранний корень
+        if best is not None and best[0] >= DEDUP_THRESHOLD:
+            linked[task_id] = -best[1]
+            continue
+        # Новый корень — в индекс и в кандидаты для следующих задач пачки
+        roots.append({"task_id": task_id, "signature": _PACK.pack(*sig), "created_at": created_at})
+        root_buckets.extend({"bucket": bucket, "task_id": task_id} for bucket in task_buckets)
+        known[task_id] = sig
+        for bucket in task_buckets:
+            members.setdefault(bucket, []).append(task_id)
+    if roots:
+        db.execute(insert(Signature), roots)
+        db.execute(insert(Bucket), root_buckets)
+    return linked
+
+
+# Задачи уходят из рабочей таблицы (удаление, архив): убрать их из индекса и отвязать дубликаты —
+# те становятся самостоятельными задачами. Возвращает коды отвязанных задач для сброса code_cache.
+def forget(db: Session, ids):
+    Task, Signature, Bucket = models.Task, models.TaskSignature, models.TaskLshBucket
+    ids = list(ids)
+    released = []
+    for i in range(0, len(ids), _CHUNK):
+        chunk = ids[i:i + _CHUNK]
+        db.execute(delete(Bucket).where(Bucket.task_id.in_(chunk)))
+        db.execute(delete(Signature).where(Signature.task_id.in_(chunk)))
+        rows = db.execute(
+            update(Task)
+            .where(Task.parent_id.in_(chunk), Task.id.not_in(chunk))
+            .values(parent_id=None)
+            .returning(Task.id, Task.code)
+            .execution_options(synchronize_session=False)
+        ).all()
+        for row in rows:
+            events.collect(db, "update", row.id, {"parent_id": None})
+        released.extend(row.code for row in rows)
+    return released
+
+
+# Индекс держит только окно DEDUP_WINDOW_DAYS — старые подписи и их корзины удаляет sweeper
+def prune(db: Session, now: datetime = None):
+    Signature, Bucket = models.TaskSignature, models.TaskLshBucket
+    cutoff = (now or datetime.utcnow()) - timedelta(days=DEDUP_WINDOW_DAYS)
+    db.execute(delete(Bucket).where(Bucket.task_id.in_(
+        select(Signature.task_id).where(Signature.created_at < cutoff)
+    )))
+    removed = db.execute(delete(Signature).where(Signature.created_at < cutoff)).rowcount
+    db.commit()
+    return removed
+
+
+# Пересчитать подписи уже проиндексированных корней (после смены хэш-функции), пачками
+def rebuild(db: Session, batch_size: int = 1000):
+    Task, Signature, Bucket = models.Task, models.TaskSignature, models.TaskLshBucket
+    rows = db.execute(
+        select(Signature.task_id, Task.content).join(Task, Task.id == Signature.task_id).order_by(Signature.task_id)
+    ).all()
+    db.execute(delete(Bucket))
+    for i in range(0, len(rows), batch_size):
+        batch = rows[i:i + batch_size]
+        sigs = signatures([row.content for row in batch], enabled=True)
+        stale = [row.task_id for row, sig in zip(batch, sigs) if sig is None]
+        if stale:
+            db.execute(delete(Signature).where(Signature.task_id.in_(stale)))
+        fresh = [(row.task_id, sig) for row, sig in zip(batch, sigs) if sig is not None]
+        if fresh:
+            db.execute(
+                update(Signature.__table__).where(Signature.task_id == bindparam("id")).values(signature=bindparam("sig")),
+                [{"id": task_id, "sig": _PACK.pack(*sig)} for task_id, sig in fresh],
+            )
+            db.execute(insert(Bucket), [
+                {"bucket": bucket, "task_id": task_id} for task_id, sig in fresh for bucket in buckets(sig)
+            ])
+    db.commit()
+    return len(rows)
@@ -0,0 +1,267 @@
+import asyncio
+import enum
+import json
+import logging
+import os
+import secrets
+import threading
+from collections import deque
+from datetime import datetime
+from sqlalchemy import event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+from . import schemas, versions
+
+logger = logging.getLogger(__name__)
+
+# Лента изменений задач для панели модератора (GET /events, Server-Sent Events).
+# crud складывает события в session.info, после commit они уходят в брокер,
+# который раздаёт их всем подписчикам этого процесса. Откат транзакции события отбрасывает.
+# EVENTS_BACKEND=postgres — события идут через NOTIFY в той же транзакции и принимаются
+# LISTEN-соединением в каждом воркере; local — только внутри процесса.
+
+EVENTS_BACKEND = os.getenv("EVENTS_BACKEND", "local")
+EVENTS_BUFFER = int(os.getenv("EVENTS_BUFFER", "1000"))  # событий для догонки по Last-Event-ID
+EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", "500"))  # на подписчика; переполнение — reset
+EVENTS_HEARTBEAT = float(os.getenv("EVENTS_HEARTBEAT", "15"))
+
+_PENDING = "task_events"
+RESET = object()  # клиент должен перезагрузить список целиком
+
+
+# Компактные события: {"op": "create"|"update"|"delete", "id": ..., "task": {изменённые поля}}
+def collect(db: Session, op: str, task_id: int, fields: dict = None):
+    item = {"op": op, "id": task_id}
+    if fields is not None:
+        item["task"] = fields
+    db.info.setdefault(_PENDING, []).append(item)
+
+
+def task_fields(task) -> dict:
+    return schemas.TaskSummaryOut.model_validate(task).model_dump(mode="json")
+
+
+_SUMMARY_FIELDS = tuple(schemas.TaskSummaryOut.model_fields)
+
+
+def _json_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, enum.Enum):
+        return value.value
+    return value
+
+
+# То же, что task_fields, из готового словаря строки (пакетная вставка) — без валидации pydantic
+def row_fields(row: dict) -> dict:
+    return {name: _json_value(row.get(name)) for name in _SUMMARY_FIELDS}
+
+
+class Broker:
+    def __init__(self, buffer_size: int = EVENTS_BUFFER, queue_size: int = EVENTS_QUEUE_SIZE):
+        self.token = secrets.token_hex(4)  # id событий различаются между воркерами и перезапусками
+        self.queue_size = queue_size
+        self._seq = 0
+        self._buffer = deque(maxlen=buffer_size)  # (id, data)
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._loop = None
+
+    def bind(self, loop):
+        self._loop = loop
+
+    # Вызывается из любого потока (commit в пуле потоков, sweeper)
+    def dispatch(self, items):
+        batch = []
+        with self._lock:
+            for item in items:
+                self._seq += 1
+                entry = (f"{self.token}-{self._seq}", json.dumps(item, ensure_ascii=False))
+                self._buffer.append(entry)
+                batch.append(entry)
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._fanout(batch)
+        else:
+            loop.call_soon_threadsafe(self._fanout, batch)
+
+    def _fanout(self, batch):
+        for queue in list(self._subscribers):
+            for entry in batch:
+                if not self._offer(queue, entry):
+                    break
+
+    # Медленный подписчик не тормозит остальных: очередь сбрасывается, клиент получает reset
+    def _offer(self, queue: asyncio.Queue, entry) -> bool:
+        try:
+            queue.put_nowait(entry)
+            return True
+        except asyncio.QueueFull:
+            self._subscribers.discard(queue)
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(RESET)
+            return False
+
+    def _since(self, last_event_id: str):
+        ids = [entry[0] for entry in self._buffer]
+        if last_event_id not in ids:
+            return None
+        return list(self._buffer)[ids.index(last_event_id) + 1:]
+
+    def subscribe(self, last_event_id: str = None) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        with self._lock:
+            backlog = self._since(last_event_id) if last_event_id else []
+            self._subscribers.add(queue)
+        if backlog is None:
+            self._offer(queue, RESET)  # событие вытеснено из буфера или пришло от другого воркера
+        for entry in backlog or ():
+            if not self._offer(queue, entry):
+                break
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    def __len__(self):
+        return len(self._subscribers)
+
+
+class LocalBackend:
+    async def start(self, broker: Broker):
+        pass
+
+    async def stop(self):
+        pass
+
+    def before_commit(self, session: Session, items):
+        pass
+
+    def after_commit(self, items):
+        broker.dispatch(items)
+
+
+# NOTIFY отправляется в транзакции изменения и доставляется только после её commit.
+# Полезная нагрузка NOTIFY ограничена 8000 байт — события пакуются в пачки,
+# слишком большие заменяются на {"op", "id"} без полей (клиент перечитает список).
+class PostgresBackend:
+    channel = "task_events"
+    max_payload = 7900
+
+    def __init__(self, url: str):
+        self.url = url
+        self._conn = None
+
+    async def start(self, broker: Broker):
+        import asyncpg
+        self.broker = broker
+        dsn = make_url(self.url).set(drivername="postgresql").render_as_string(hide_password=False)
+        self._conn = await asyncpg.connect(dsn)
+        await self._conn.add_listener(self.channel, self._on_notify)
+
+    async def stop(self):
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
+
+    def _on_notify(self, connection, pid, channel, payload):
+        self.broker.dispatch(json.loads(payload))
+
+    def _pack(self, items):
+        chunk, size = [], 2
+        for item in items:
+            data = json.dumps(item, ensure_ascii=False)
+            if len(data.encode()) > self.max_payload:
+                data = json.dumps({"op": item["op"], "id": item["id"]})
+            if chunk and size + len(data.encode()) + 1 > self.max_payload:
+                yield "[" + ",".join(chunk) + "]"
+                chunk, size = [], 2
+            chunk.append(data)
+            size += len(data.encode()) + 1
+        if chunk:
+            yield "[" + ",".join(chunk) + "]"
+
+    def before_commit(self, session: Session, items):
+        for payload in self._pack(items):
+            session.execute(text("SELECT pg_notify(:channel, :payload)"),
+                            {"channel": self.channel, "payload": payload})
+
+    def after_commit(self, items):
+        pass  # события придут через LISTEN, в том числе в этот воркер
+
+
+broker = Broker()
+
+
+def _make_backend():
+    if EVENTS_BACKEND == "postgres":
+        from .database import DATABASE_URL
+        return PostgresBackend(DATABASE_URL)
+    return LocalBackend()
+
+
+backend = _make_backend()
+
+
+# Транзакция с изменениями задач получает новый номер версии данных (versions.py)
+@event.listens_for(Session, "before_commit")
+def _before_commit(session):
+    items = session.info.get(_PENDING)
+    if items:
+        session.flush()  # before_commit идёт до финального flush — строки должны уже быть в БД
+        versions.stamp(session, versions.bump(session), items)
+        backend.before_commit(session, items)
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session):
+    items = session.info.pop(_PENDING, None)
+    if items:
+        try:
+            backend.after_commit(items)
+        except Exception:
+            logger.exception("Publishing task events failed")
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session):
+    session.info.pop(_PENDING, None)
+
+
+async def start(loop=None):
+    broker.bind(loop or asyncio.get_running_loop())
+    await backend.start(broker)
+
+
+async def stop():
+    await backend.stop()
+    broker.bind(None)
+
+
+# Поток SSE для одного клиента: догонка после Last-Event-ID, затем события по мере commit'ов
+async def stream(request, last_event_id: str = None):
+    queue = broker.subscribe(last_event_id)
+    try:
+        yield "retry: 3000\n\n"
+        while True:
+            try:
+                entry = await asyncio.wait_for(queue.get(), EVENTS_HEARTBEAT)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    break
+                yield ": ping\n\n"
+                continue
+            if entry is RESET:
+                yield "event: reset\ndata: {}\n\n"
+                break
+            event_id, data = entry
+            yield f"id: {event_id}\ndata: {data}\n\n"
+    finally:
+        broker.unsubscribe(queue)
@@ -0,0 +1,51 @@
+import enum
+import json
+import logging
+from datetime import date, datetime
+from fastapi.responses import Response
+
+# Быстрая сериализация больших ответов (списки, выгрузка, статистика).
+# Строки приходят из crud готовыми словарями из кортежей колонок — без pydantic-валидации,
+# кодирует orjson. Формат на проводе тот же, что у JSONResponse FastAPI: компактный JSON
+# в UTF-8, даты ISO 8601 без часового пояса, перечисления — значениями.
+# Без orjson — запасной путь на json стандартной библиотеки с тем же результатом.
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+
+# Вызывается при старте приложения: без orjson ответы заметно медленнее — пусть это будет видно в логах
+def log_backend():
+    if orjson is None:
+        logger.warning("orjson is not installed: responses are encoded with the stdlib json fallback")
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, enum.Enum):
+        return value.value
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":"),
+                      default=_default).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+# Построчная выгрузка (application/x-ndjson): по объекту на строку
+def ndjson_lines(rows) -> bytes:
+    return b"".join(dumps(row) + b"\n" for row in rows)
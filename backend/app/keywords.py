@@ -1,14 +1,172 @@
-KEYWORDS_DEPARTMENT = {
-    "дорога": "Отдел транспорта",
-    "мусор": "ЖКХ",
-    "вода": "Коммунальные службы",
-    "освещение": "Энергетика",
-    "интернет": "Цифровизация",
-    "экология": "Экология"
-}
+import functools
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+
+# Маршрутизация обращений по ключевым словам.
+# Словарь лежит в keywords.json (путь переопределяется KEYWORDS_FILE) и перечитывается
+# при изменении файла без перезапуска. Термины приводятся к основам слов и собираются
+# в автомат Ахо–Корасик над последовательностями основ: текст сканируется за один проход.
+
+KEYWORDS_FILE = os.getenv("KEYWORDS_FILE", os.path.join(os.path.dirname(__file__), "keywords.json"))
+KEYWORDS_RELOAD_INTERVAL = float(os.getenv("KEYWORDS_RELOAD_INTERVAL", "5"))  # сек между проверками mtime
+
+_WORD_RE = re.compile(r"[0-9a-zа-я]+(?:-[0-9a-zа-я]+)*")
+
+# Окончания для лёгкого стемминга, от длинных к коротким
+_SUFFIXES = sorted([
+    "ическими", "ическому", "ического", "ический", "ическая", "ическое", "ические", "ических", "ической",
+    "ениями", "ением", "ениям", "ениях", "ение", "ения", "ению", "ении", "ений",
+    "остями", "остью", "ость", "ости", "остей",
+    "иями", "ями", "ами", "иям", "иях", "ией", "ием",
+    "ого", "его", "ому", "ему", "ыми", "ими",
+    "ой", "ей", "ий", "ый", "ая", "яя", "ое", "ее", "ые", "ие", "ых", "их",
+    "ом", "ем", "ам", "ям", "ах", "ях", "ов", "ев", "ию", "ия", "ии", "ью",
+    "а", "я", "о", "е", "ы", "и", "у", "ю", "ь", "й",
+], key=len, reverse=True)
+# Окончания по длине: на слово — по одной проверке множества на каждую длину, а не перебор списка
+_SUFFIX_GROUPS = [
+    (size, frozenset(s for s in _SUFFIXES if len(s) == size))
+    for size in sorted({len(s) for s in _SUFFIXES}, reverse=True)
+]
+_MIN_STEM = 3
+STEM_CACHE_SIZE = int(os.getenv("STEM_CACHE_SIZE", "65536"))
+
+
+# Словарь жалоб невелик — основы кэшируются (LRU)
+@functools.lru_cache(maxsize=STEM_CACHE_SIZE)
+def stem(word: str) -> str:
+    for size, group in _SUFFIX_GROUPS:
+        if len(word) - size >= _MIN_STEM and word[-size:] in group:
+            return word[:-size]
+    return word
+
+
+def normalize(text: str):
+    return [stem(word) for word in _WORD_RE.findall(text.lower().replace("ё", "е"))]
+
+
+class KeywordMatcher:
+    def __init__(self, terms, departments, default: str):
+        # terms: [(термин, отдел)]; departments — порядок отделов для разрешения ничьих
+        self.default = default
+        self._rank = {dept: i for i, dept in enumerate(departments)}
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        for term, dept in terms:
+            stems = normalize(term)
+            if not stems:
+                continue
+            node = 0
+            for s in stems:
+                nxt = self._goto[node].get(s)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][s] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                node = nxt
+            self._out[node].append((dept, len(stems)))
+
+        # Суффиксные ссылки обходом в ширину
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for s, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and s not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(s, 0)
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def scores(self, stems):
+        scores = {}
+        node = 0
+        for s in stems:
+            while node and s not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(s, 0)
+            for dept, weight in self._out[node]:
+                scores[dept] = scores.get(dept, 0) + weight
+        return scores
+
+    # Кандидаты [(отдел, вес)] по убыванию веса; при равенстве — в порядке словаря
+    def classify(self, text: str):
+        scores = self.scores(normalize(text))
+        return sorted(scores.items(), key=lambda item: (-item[1], self._rank.get(item[0], 0)))
+
+
+def load_config(path: str = KEYWORDS_FILE):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def build_matcher(config) -> KeywordMatcher:
+    departments = config["departments"]
+    terms = [(term, dept) for dept, entry in departments.items() for term in entry.get("terms", [])]
+    return KeywordMatcher(terms, list(departments), config.get("default", "Общие обращения"))
+
+
+_lock = threading.Lock()
+_config = None
+_matcher = None
+_mtime = None
+_checked_at = 0.0
+
+
+def reload(path: str = KEYWORDS_FILE):
+    global _config, _matcher, _mtime, _checked_at
+    with _lock:
+        mtime = os.stat(path).st_mtime
+        config = load_config(path)
+        _matcher = build_matcher(config)
+        _config = config
+        _mtime = mtime
+        _checked_at = time.monotonic()
+    return _matcher
+
+
+def _current() -> KeywordMatcher:
+    global _checked_at
+    if _matcher is None:
+        return reload()
+    now = time.monotonic()
+    if now - _checked_at >= KEYWORDS_RELOAD_INTERVAL:
+        _checked_at = now
+        try:
+            if os.stat(KEYWORDS_FILE).st_mtime != _mtime:
+                return reload()
+        except (OSError, ValueError, KeyError):
+            pass  # битый или недоступный файл — продолжаем со старым словарём
+    return _matcher
+
+
+# Тема кнопки в боте -> отдел
+def topic_departments():
+    _current()
+    return {entry["topic"]: dept for dept, entry in _config["departments"].items() if entry.get("topic")}
+
+
+def default_department():
+    return _current().default
+
+
+def classify(text: str):
+    return _current().classify(text)
+
+
+def classify_many(texts):
+    matcher = _current()
+    return [matcher.classify(text) for text in texts]
+
 
 def match_department(text: str):
-    for keyword, dept in KEYWORDS_DEPARTMENT.items():
-        if keyword in text.lower():
-            return dept
-    return "Общие обращения"
+    matcher = _current()
+    candidates = matcher.classify(text)
+    return candidates[0][0] if candidates else matcher.default
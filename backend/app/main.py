@@ -1,121 +1,431 @@
 import os
-from fastapi import FastAPI, Depends, HTTPException, Body
+import json
+import asyncio
+import hashlib
+from contextlib import asynccontextmanager
+from fastapi import APIRouter, FastAPI, Depends, HTTPException, Body, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
-from sqlalchemy.orm import Session
-from . import models, schemas, crud, database
-from .database import SessionLocal, engine
-from telegram import Bot
-from fpdf import FPDF
-from datetime import datetime
+from fastapi.responses import Response, StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models, schemas, migrations, crud_async, database, utils, sweeper, archive, report, outbox, search, events, fastjson, metrics, dedup, classifier
+from .database import AsyncSessionLocal, engine
+from .cache import code_cache
+from .crud import SyncExpired, BULK_ID_CHUNK
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
 from dotenv import load_dotenv
 
 load_dotenv()
-BOT_TOKEN = os.getenv("BOT_TOKEN")
-bot = Bot(token=BOT_TOKEN)
 
-models.Base.metadata.create_all(bind=engine)
+# Миграции схемы при старте приложения; 0 — их выполняет отдельный шаг деплоя
+# (python -m backend.app.migrations), воркеры стартуют без обращения к БД
+MIGRATE_ON_STARTUP = os.getenv("MIGRATE_ON_STARTUP", "1").lower() not in ("0", "false", "no")
 
-app = FastAPI()
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    fastjson.log_backend()
+    await run_in_threadpool(classifier.log_backend)  # заодно открывает веса модели до первых запросов
+    if MIGRATE_ON_STARTUP:
+        await run_in_threadpool(migrations.migrate, engine)
+    await events.start()
+    background = []
+    if sweeper.OVERDUE_SWEEP_INTERVAL > 0:
+        background.append(asyncio.create_task(sweeper.run_overdue_sweeper()))
+    if outbox.OUTBOX_POLL_INTERVAL > 0:
+        background.append(asyncio.create_task(outbox.run_outbox_dispatcher()))
+    if archive.ARCHIVE_INTERVAL > 0:
+        background.append(asyncio.create_task(archive.run_archiver()))
+    yield
+    for task in background:
+        task.cancel()
+    await asyncio.gather(*background, return_exceptions=True)
+    await events.stop()
+    await database.async_engine.dispose()
 
-def get_db():
-    db = SessionLocal()
-    try:
+
+router = APIRouter()
+
+# Обработчики работают на асинхронном движке: ожидание БД не занимает поток из пула
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 
-@app.post("/tasks", response_model=schemas.TaskOut)
-def create_task(task: schemas.TaskCreate, db: Session = Depends(get_db)):
-    created = crud.create_task(db, task)
-    return created
+@router.post("/tasks", response_model=schemas.TaskOut)
+async def create_task(task: schemas.TaskCreate, db: AsyncSession = Depends(get_db)):
+    # MinHash-подпись для поиска дубликатов — чистый CPU: в пуле потоков, до транзакции
+    signature = (await run_in_threadpool(dedup.signatures, [task.content]))[0]
+    return await crud_async.create_task(db, task, signature=signature, schema=schemas.TaskOut)
+
+
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "1000"))
+
+
+# Элементы тела запроса: JSON-массив целиком или NDJSON построчно (по мере чтения потока)
+async def _bulk_items(request: Request):
+    if request.headers.get("content-type", "").startswith("application/x-ndjson"):
+        buffer = b""
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield line
+        if buffer.strip():
+            yield buffer
+        return
+    try:
+        items = json.loads(await request.body())
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Ожидается JSON-массив или NDJSON")
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="Ожидается JSON-массив или NDJSON")
+    for item in items:
+        yield item
+
+
+def _validation_message(error: ValidationError):
+    return "; ".join(f"{'.'.join(map(str, e['loc'])) or 'item'}: {e['msg']}" for e in error.errors())
+
+
+# Пакетная загрузка обращений: каждая пачка из BULK_CHUNK_SIZE строк — один INSERT и один commit.
+# Ошибки валидации и БД возвращаются по индексам элементов, остальные строки сохраняются:
+# пачка, которую откатила ошибка БД, повторяется по одной строке.
+@router.post("/tasks/bulk")
+async def create_tasks_bulk(request: Request, db: AsyncSession = Depends(get_db)):
+    created, errors = [], []
+    chunk, indexes = [], []
+
+    async def insert(tasks, positions, signatures=None):
+        if signatures is None:
+            signatures = await run_in_threadpool(dedup.signatures, [task.content for task in tasks])
+        try:
+            rows = await crud_async.create_tasks_bulk(db, tasks, signatures)
+        except Exception as e:
+            await db.rollback()
+            if len(tasks) == 1:
+                errors.append({"index": positions[0], "error": f"{type(e).__name__}: {e}"[:300]})
+                return
+            for task, i, sig in zip(tasks, positions, signatures):
+                await insert([task], [i], [sig])
+        else:
+            created.extend({"index": i, "id": task_id, "code": code} for i, (task_id, code) in zip(positions, rows))
+
+    async def flush():
+        await insert(list(chunk), list(indexes))
+        chunk.clear()
+        indexes.clear()
 
+    index = 0
+    async for raw in _bulk_items(request):
+        try:
+            item = json.loads(raw) if isinstance(raw, bytes) else raw
+            chunk.append(schemas.TaskCreate.model_validate(item))
+            indexes.append(index)
+        except ValueError as e:  # ValidationError — тоже ValueError
+            message = _validation_message(e) if isinstance(e, ValidationError) else "invalid JSON"
+            errors.append({"index": index, "error": message})
+        index += 1
+        if len(chunk) >= BULK_CHUNK_SIZE:
+            await flush()
+    if chunk:
+        await flush()
 
-@app.get("/tasks", response_model=list[schemas.TaskOut])
-def get_tasks(db: Session = Depends(get_db)):
-    return crud.get_tasks(db)
+    errors.sort(key=lambda e: e["index"])
+    return {"created": len(created), "failed": len(errors), "items": created, "errors": errors}
+
+
+# Пакетные смена статуса и удаление: {"ids": [...]} или {"filter": {...}} (хотя бы одно условие),
+# одна транзакция на весь запрос. Объявлены до /tasks/{task_id}.
+def _check_selection(selection: schemas.TaskSelection):
+    if (selection.ids is None) == (selection.filter is None):
+        raise HTTPException(status_code=400, detail="Укажите либо ids, либо filter")
+    if selection.ids is not None and not 0 < len(selection.ids) <= BULK_ID_CHUNK:
+        raise HTTPException(status_code=400, detail=f"ids: от 1 до {BULK_ID_CHUNK} задач")
+    if selection.filter is not None and not selection.filter.model_dump(exclude_none=True):
+        raise HTTPException(status_code=400, detail="Пустой фильтр затронул бы все задачи")
+
+
+@router.patch("/tasks/bulk")
+async def update_tasks_bulk(body: schemas.TaskBulkUpdate, db: AsyncSession = Depends(get_db)):
+    _check_selection(body)
+    return await crud_async.update_tasks_status_bulk(db, body, body.status)
+
+
+@router.delete("/tasks/bulk")
+async def delete_tasks_bulk(selection: schemas.TaskSelection, db: AsyncSession = Depends(get_db)):
+    _check_selection(selection)
+    return await crud_async.delete_tasks_bulk(db, selection)
+
+
+# Кластеры почти-дубликатов (dedup.py): список и действия над всем кластером сразу
+@router.get("/tasks/clusters", response_model=schemas.ClusterPage)
+async def get_clusters(
+    status: models.StatusEnum = None,
+    limit: int = Query(50, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_db),
+):
+    return await crud_async.get_clusters(db, status=status, limit=limit, offset=offset)
+
+
+@router.patch("/tasks/clusters/{parent_id}")
+async def update_cluster(parent_id: int, status: schemas.TaskUpdate, db: AsyncSession = Depends(get_db)):
+    result = await crud_async.update_cluster_status(db, parent_id, status.status)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return result
+
+
+@router.post("/tasks/clusters/{parent_id}/reply")
+async def reply_to_cluster(parent_id: int, message: str = Body(...), db: AsyncSession = Depends(get_db)):
+    result = await crud_async.save_cluster_reply(db, parent_id, message, moderator_name="Модератор")
+    if result is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    outbox.wake()
+    return result
 
 
-@app.get("/tasks/code/{code}", response_model=schemas.TaskOut)
-def get_by_code(code: str, db: Session = Depends(get_db)):
-    task = crud.get_task_by_code(db, code)
+# Условный GET: ETag из номера версии данных (versions.py) и строки запроса. Совпадение
+# с If-None-Match — 304 без выборки самих данных. Last-Modified — время этой версии.
+async def _validators(request: Request, db: AsyncSession):
+    version, changed_at = await crud_async.get_data_version(db)
+    tag = f"{version}|{request.url.path}?{request.url.query}"
+    headers = {"ETag": f'W/"{hashlib.sha1(tag.encode()).hexdigest()[:20]}"', "Cache-Control": "no-cache"}
+    if changed_at:
+        headers["Last-Modified"] = format_datetime(changed_at.replace(tzinfo=timezone.utc), usegmt=True)
+    return headers
+
+
+def _not_modified(request: Request, headers: dict) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or headers["ETag"].removeprefix("W/") in tags
+    # If-Modified-Since точен до секунды: изменение в ту же секунду дало бы ложный 304.
+    # При ETag он не учитывается (RFC 9110, 13.2.2) — клиент сравнивает по If-None-Match
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and "Last-Modified" in headers and "ETag" not in headers:
+        try:
+            return parsedate_to_datetime(if_modified_since) >= parsedate_to_datetime(headers["Last-Modified"])
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+# По умолчанию — облегчённые строки (TaskSummaryOut); ?include=responses — полные TaskOut с ответами
+# ?since=<токен> — только изменения и удаления после токена (первый запрос: since=0)
+@router.get("/tasks")
+async def get_tasks(
+    request: Request,
+    filters: schemas.TaskFilter = Depends(),
+    cursor: str | None = None,
+    since: str | None = None,
+    limit: int = Query(50, ge=1, le=500),
+    include: str | None = Query(None, pattern="^responses$"),
+    db: AsyncSession = Depends(get_db),
+):
+    try:
+        after = utils.decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Некорректный курсор")
+    try:
+        since_key = utils.decode_since(since) if since and since != "0" else None
+    except ValueError:  # в том числе токены по времени из прежних версий
+        raise HTTPException(status_code=410, detail="Токен since устарел, загрузите список заново")
+    if since and (cursor or include or filters.model_dump(exclude_none=True)):
+        raise HTTPException(status_code=400, detail="since нельзя сочетать с cursor, include и фильтрами")
+
+    headers = await _validators(request, db)
+    if _not_modified(request, headers):
+        return Response(status_code=304, headers=headers)
+
+    # Строки из кортежей колонок + fastjson; формат — TaskDelta / TaskPage / TaskSummaryPage
+    if since:
+        try:
+            delta = await crud_async.get_changes(db, since_key, limit=limit)
+        except SyncExpired:
+            raise HTTPException(status_code=410, detail="Токен since устарел, загрузите список заново")
+        return fastjson.FastJSONResponse(delta, headers=headers)
+    page = await crud_async.get_task_rows(db, filters, after=after, limit=limit,
+                                          include_responses=include == "responses")
+    return fastjson.FastJSONResponse(page, headers=headers)
+
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "2000"))
+
+
+# Выгрузка задач под фильтрами в NDJSON (строка — TaskSummaryOut или TaskOut с include=responses).
+# Читается keyset-страницами по EXPORT_BATCH_SIZE, у каждой страницы своя короткая сессия,
+# ответ отдаётся потоком — память не растёт с размером выгрузки.
+# archived=true — после рабочих задач выгружается и архив (archive.py), тоже новые сверху.
+@router.get("/tasks/export")
+async def export_tasks(
+    filters: schemas.TaskFilter = Depends(),
+    include: str | None = Query(None, pattern="^responses$"),
+    archived: bool = False,
+):
+    async def lines():
+        for source in ((False, True) if archived else (False,)):
+            after = None
+            while True:
+                async with AsyncSessionLocal() as db:
+                    page = await crud_async.get_task_rows(db, filters, after=after, limit=EXPORT_BATCH_SIZE,
+                                                          include_responses=include == "responses",
+                                                          archived=source)
+                if page["items"]:
+                    yield fastjson.ndjson_lines(page["items"])
+                if not page["next_cursor"]:
+                    break
+                after = utils.decode_cursor(page["next_cursor"])
+
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="tasks.ndjson"'},
+    )
+
+
+# Полнотекстовый и нечёткий поиск по содержанию и коду, с ранжированием и подсветкой
+@router.get("/tasks/search", response_model=schemas.SearchPage)
+async def search_tasks(
+    q: str = Query(..., min_length=2, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=10000),
+    db: AsyncSession = Depends(get_db),
+):
+    rows = await db.run_sync(search.search_tasks, q.strip(), limit=limit + 1, offset=offset)
+    items = [
+        {"task": schemas.TaskSummaryOut.model_validate(row._mapping), "rank": row.rank, "snippet": row.snippet or ""}
+        for row in rows[:limit]
+    ]
+    return {"items": items, "next_offset": offset + limit if len(rows) > limit else None}
+
+
+# Частые повторные запросы статуса из бота обслуживаются из code_cache
+@router.get("/tasks/code/{code}", response_model=schemas.TaskOut)
+async def get_by_code(code: str, db: AsyncSession = Depends(get_db)):
+    cached = code_cache.get(code)
+    if cached is not None:
+        return cached
+    # Поколение до чтения: изменение задачи во время запроса не даст закэшировать старую строку
+    generation = code_cache.generation(code)
+    task = await crud_async.get_task_by_code(db, code, schema=schemas.TaskOut)
     if not task:
         raise HTTPException(status_code=404, detail="Код обращения не найден")
-    return task
+    data = task.model_dump(mode="json")
+    code_cache.set(code, data, generation)
+    return data
 
 
-@app.put("/tasks/{task_id}", response_model=schemas.TaskOut)
-def update_task(task_id: int, status: schemas.TaskUpdate, db: Session = Depends(get_db)):
-    updated = crud.update_task_status(db, task_id, status)
+@router.put("/tasks/{task_id}", response_model=schemas.TaskOut)
+async def update_task(task_id: int, status: schemas.TaskUpdate, db: AsyncSession = Depends(get_db)):
+    updated = await crud_async.update_task_status(db, task_id, status, schema=schemas.TaskOut)
     if not updated:
         raise HTTPException(status_code=404, detail="Задача не найдена")
     return updated
 
 
-@app.delete("/tasks/{task_id}")
-def delete_task(task_id: int, db: Session = Depends(get_db)):
-    task = db.query(models.Task).filter(models.Task.id == task_id).first()
-    if not task:
+@router.delete("/tasks/{task_id}")
+async def delete_task(task_id: int, db: AsyncSession = Depends(get_db)):
+    if not await crud_async.delete_task(db, task_id):
         raise HTTPException(status_code=404, detail="Task not found")
-    db.delete(task)
-    db.commit()
     return {"message": "Deleted"}
 
 
-@app.get("/stats")
-def get_stats(db: Session = Depends(get_db)):
-    return crud.get_task_stats(db)
+@router.get("/stats")
+async def get_stats(request: Request, db: AsyncSession = Depends(get_db)):
+    headers = await _validators(request, db)
+    if _not_modified(request, headers):
+        return Response(status_code=304, headers=headers)
+    return fastjson.FastJSONResponse(await crud_async.get_task_stats(db), headers=headers)
 
 
-@app.get("/stats/full")
-def get_full_stats(db: Session = Depends(get_db)):
-    return crud.get_detailed_stats(db)
+@router.get("/stats/full")
+async def get_full_stats(request: Request, db: AsyncSession = Depends(get_db)):
+    headers = await _validators(request, db)
+    if _not_modified(request, headers):
+        return Response(status_code=304, headers=headers)
+    return fastjson.FastJSONResponse(await crud_async.get_detailed_stats(db), headers=headers)
 
 
-@app.get("/stats/report")
-def download_stats_report(db: Session = Depends(get_db)):
-    stats = crud.get_detailed_stats(db)
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_font("Arial", size=12)
-    pdf.cell(200, 10, txt="📄 Отчёт по обращениям", ln=True, align="C")
-    pdf.ln(10)
+@router.get("/stats/cache")
+async def get_cache_stats():
+    return {"code_lookup": code_cache.stats()}
 
-    for dept, data in stats.items():
-        pdf.set_font("Arial", "B", size=12)
-        pdf.cell(0, 10, f"{dept}:", ln=True)
-        pdf.set_font("Arial", size=11)
-        pdf.cell(0, 8, f"  Всего: {data['total']}", ln=True)
-        pdf.cell(0, 8, f"  Выполнено: {data['done']}", ln=True)
-        pdf.cell(0, 8, f"  В процессе: {data['in_progress']}", ln=True)
-        pdf.cell(0, 8, f"  Просрочено: {data['overdue']}", ln=True)
-        pdf.cell(0, 8, f"  Среднее время: {data['avg_hours']} ч", ln=True)
-        pdf.ln(5)
 
-    path = "report.pdf"
-    pdf.output(path)
-    return FileResponse(path, filename="report.pdf", media_type='application/pdf')
+@router.get("/stats/report")
+async def download_stats_report(
+    department: str | None = None,
+    created_from: datetime | None = None,
+    created_to: datetime | None = None,
+    db: AsyncSession = Depends(get_db),
+):
+    key = (department, created_from, created_to)
+    version, _ = await crud_async.get_data_version(db)
+    pdf = report.cached_report(key, version)
+    if pdf is None:
+        filters = schemas.TaskFilter(department=department, created_from=created_from, created_to=created_to)
+        stats = await crud_async.get_detailed_stats(db, filters)
+        # Рендер PDF нагружает CPU — в пуле потоков, чтобы не держать цикл событий
+        pdf = await run_in_threadpool(report.render_stats_report, stats)
+        report.store_report(key, version, pdf)
+    return Response(
+        content=pdf,
+        media_type="application/pdf",
+        headers={"Content-Disposition": 'attachment; filename="report.pdf"'},
+    )
 
 
-@app.post("/tasks/{task_id}/reply")
-def reply_to_user(task_id: int, message: str = Body(...), db: Session = Depends(get_db)):
-    task = db.query(models.Task).filter(models.Task.id == task_id).first()
+# Ответ сохраняется вместе с сообщением в outbox; в Telegram его отправит фоновый диспетчер
+@router.post("/tasks/{task_id}/reply")
+async def reply_to_user(task_id: int, message: str = Body(...), db: AsyncSession = Depends(get_db)):
+    task = await crud_async.get_task(db, task_id)
     if not task or not task.telegram_id:
         raise HTTPException(status_code=404, detail="Task or Telegram ID not found")
 
-    try:
-        # Сохраняем ответ модератора и отправляем
-        crud.save_reply(db, task_id, message, moderator_name="Модератор")
-        bot.send_message(chat_id=task.telegram_id, text=f"📢 Ответ на ваше обращение:\n\n{message}")
-        return {"status": "ok"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Ошибка отправки: {e}")
+    await crud_async.save_reply(db, task_id, message, moderator_name="Модератор")
+    outbox.wake()
+    return {"status": "queued"}
+
+
+# Лента изменений задач (SSE): панель загружает список один раз и применяет события
+@router.get("/events")
+async def task_events(request: Request):
+    return StreamingResponse(
+        events.stream(request, request.headers.get("last-event-id")),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# Метрики для Prometheus: задержки по маршрутам, SQL на запрос, ожидание пула, отправка в Telegram
+@router.get("/metrics")
+async def prometheus_metrics():
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+# Фабрика приложения. Импорт модуля не подключается к БД и не загружает необязательные
+# зависимости: fpdf (report.py) и клиент Telegram (outbox.py) импортируются при первом использовании,
+# схема — в lifespan.
+def create_app() -> FastAPI:
+    app = FastAPI(lifespan=lifespan)
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=["ETag", "Last-Modified"],
+    )
+    app.add_middleware(metrics.MetricsMiddleware)
+    app.include_router(router)
+    metrics.instrument_engine(engine)
+    metrics.instrument_engine(database.async_engine.sync_engine)
+    return app
+
+
+app = create_app()
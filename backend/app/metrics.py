@@ -0,0 +1,241 @@
+import contextvars
+import logging
+import os
+import threading
+import time
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+
+logger = logging.getLogger(__name__)
+
+# Метрики для Prometheus (GET /metrics, текстовый формат 0.0.4) без внешних зависимостей:
+# задержка и размер ответа по маршрутам, запросы в работе, число и время SQL-запросов на запрос
+# (события движка SQLAlchemy), ожидание соединения из пула и задержка отправки в Telegram.
+# Запросы дольше SLOW_REQUEST_MS пишутся в лог вместе со своими SQL-запросами.
+
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "1000"))
+SLOW_REQUEST_MAX_STATEMENTS = 50
+EXCLUDED_PATHS = {"/metrics", "/events"}  # сама выдача метрик и долгоживущий SSE
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name: str, help: str, labels=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.extend(self._samples(labels, value))
+        return lines
+
+    def _samples(self, labels, value):
+        return [f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"]
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        with self._lock:
+            counts = self._values.get(labels)
+            if counts is None:
+                counts = self._values[labels] = [[0] * len(self.buckets), 0, 0]  # по корзинам, сумма, всего
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[0][i] += 1
+                    break
+            counts[1] += value
+            counts[2] += 1
+
+    def _samples(self, labels, counts):
+        buckets, total, count = counts
+        lines, cumulative = [], 0
+        for bound, n in zip(self.buckets, buckets):
+            cumulative += n
+            le = f'le="{_number(float(bound))}"'
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+        inf = 'le="+Inf"'
+        lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, inf)} {count}")
+        lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(float(total))}")
+        lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+REGISTRY = []
+
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests", ("method", "route", "status"))
+HTTP_LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency", ("method", "route"))
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests being served")
+HTTP_RESPONSE_SIZE = Histogram("http_response_size_bytes", "HTTP response body size", ("method", "route"),
+                               buckets=SIZE_BUCKETS)
+SQL_STATEMENTS = Histogram("db_statements_per_request", "SQL statements per HTTP request", ("route",),
+                           buckets=COUNT_BUCKETS)
+SQL_TIME = Histogram("db_statement_seconds_per_request", "Total SQL time per HTTP request", ("route",))
+POOL_WAIT = Histogram("db_pool_checkout_seconds", "Wait for a pooled DB connection", ("pool",))
+TELEGRAM_SEND = Histogram("telegram_send_seconds", "Telegram sendMessage latency (outbox)", ("outcome",))
+
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# SQL текущего HTTP-запроса: contextvar виден и в greenlet асинхронной сессии,
+# и в потоках пула (run_in_threadpool копирует контекст); у фоновых задач его нет
+class RequestStats:
+    __slots__ = ("statements", "sql_seconds", "log")
+
+    def __init__(self):
+        self.statements = 0
+        self.sql_seconds = 0.0
+        self.log = []  # [(мс, SQL)] для журнала медленных запросов
+
+
+_current = contextvars.ContextVar("request_stats", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["metrics_started"].pop()
+    stats = _current.get()
+    if stats is None:
+        return
+    stats.statements += 1
+    stats.sql_seconds += elapsed
+    if len(stats.log) < SLOW_REQUEST_MAX_STATEMENTS:
+        stats.log.append((round(elapsed * 1000, 2), " ".join(statement.split())[:300]))
+
+
+def _handle_error(context):
+    started = context.connection.info.get("metrics_started") if context.connection is not None else None
+    if started:
+        started.pop()
+
+
+def instrument_engine(engine):
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine, "handle_error", _handle_error)
+
+
+# Пулы соединений, замеряющие ожидание свободного соединения (вместе с pre-ping)
+class TimedQueuePool(QueuePool):
+    label = "sync"
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            POOL_WAIT.observe(time.perf_counter() - start, self.label)
+
+
+class TimedAsyncQueuePool(AsyncAdaptedQueuePool):
+    label = "async"
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            POOL_WAIT.observe(time.perf_counter() - start, self.label)
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in EXCLUDED_PATHS:
+            await self.app(scope, receive, send)
+            return
+        stats = RequestStats()
+        token = _current.set(stats)
+        status, size = 500, 0
+
+        async def send_wrapper(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            HTTP_IN_FLIGHT.dec()
+            _current.reset(token)
+            method = scope["method"]
+            route = getattr(scope.get("route"), "path", "unmatched")  # шаблон, а не путь: без id в метках
+            HTTP_REQUESTS.inc(method, route, str(status))
+            HTTP_LATENCY.observe(elapsed, method, route)
+            HTTP_RESPONSE_SIZE.observe(size, method, route)
+            SQL_STATEMENTS.observe(stats.statements, route)
+            SQL_TIME.observe(stats.sql_seconds, route)
+            if elapsed * 1000 >= SLOW_REQUEST_MS:
+                logger.warning(
+                    "Slow request %s %s -> %d: %.0f ms, %d SQL statements in %.0f ms%s",
+                    method, scope["path"], status, elapsed * 1000, stats.statements, stats.sql_seconds * 1000,
+                    "".join(f"\n  {ms} ms  {sql}" for ms, sql in stats.log),
+                )
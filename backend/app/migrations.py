@@ -0,0 +1,193 @@
+import logging
+import sys
+from datetime import datetime
+from sqlalchemy import inspect, select, text
+from sqlalchemy.orm import Session
+from . import models, search, stats, dedup, versions
+
+logger = logging.getLogger(__name__)
+
+# Версионные миграции схемы вместо create_all при импорте.
+# Применённые версии записываются в schema_migrations; каждая миграция идемпотентна
+# (после сбоя посередине её можно выполнить заново). В Postgres прогон держит advisory-блокировку —
+# воркеры, стартующие одновременно, применяют миграции по очереди, а не параллельно.
+# Индексы на существующих таблицах Postgres строятся CREATE INDEX CONCURRENTLY — без блокировки записи.
+#   python -m backend.app.migrations [status]
+
+_LOCK_KEY = 7_202_405  # ключ pg_advisory_lock для прогона миграций
+
+MIGRATIONS = []
+
+
+def migration(version: int, name: str):
+    def register(fn):
+        MIGRATIONS.append((version, name, fn))
+        return fn
+    return register
+
+
+def _has_column(engine, table: str, column: str) -> bool:
+    return column in {c["name"] for c in inspect(engine).get_columns(table)}
+
+
+# Индекс без блокировки записи: в Postgres — CONCURRENTLY (вне транзакции),
+# недостроенный (INVALID) индекс после прерванной попытки удаляется и строится заново
+def create_index(engine, name: str, table: str, columns: str, using: str = None):
+    if using:  # метод доступа Postgres (gin, ...)
+        table = f"{table} USING {using}"
+    if engine.dialect.name != "postgresql":
+        with engine.begin() as conn:
+            conn.exec_driver_sql(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})")
+        return
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        invalid = conn.execute(text(
+            "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE c.relname = :name AND NOT i.indisvalid"
+        ), {"name": name}).first()
+        if invalid:
+            conn.exec_driver_sql(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+        conn.exec_driver_sql(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} ({columns})")
+
+
+@migration(1, "baseline")
+def _baseline(engine):
+    # Недостающие таблицы, последовательности и индексы новых таблиц; существующие не меняются
+    models.Base.metadata.create_all(bind=engine)
+
+
+@migration(2, "tasks.updated_at")
+def _updated_at(engine):
+    # Базы, созданные до дельта-синхронизации
+    if not _has_column(engine, "tasks", "updated_at"):
+        with engine.begin() as conn:
+            conn.exec_driver_sql("ALTER TABLE tasks ADD COLUMN updated_at TIMESTAMP")
+            conn.exec_driver_sql("UPDATE tasks SET updated_at = created_at WHERE updated_at IS NULL")
+
+
+@migration(3, "search schema")
+def _search(engine):
+    # Расширение — в транзакции, GIN-индексы по заполненной tasks — без блокировки записи
+    search.ensure_search_schema(engine)
+    if engine.dialect.name == "postgresql":
+        for name, columns in search.POSTGRES_INDEXES:
+            create_index(engine, name, "tasks", columns, using="gin")
+
+
+@migration(4, "task_stats backfill")
+def _task_stats(engine):
+    # Счётчики для баз, где задачи появились раньше таблицы task_stats
+    with Session(engine) as db:
+        if db.scalar(select(models.TaskStat.department).limit(1)) is None \
+                and db.scalar(select(models.Task.id).limit(1)) is not None:
+            stats.reconcile(db)
+
+
+@migration(5, "composite indexes")
+def _indexes(engine):
+    create_index(engine, "ix_tasks_created_at_id", "tasks", "created_at, id")
+    create_index(engine, "ix_tasks_status_deadline", "tasks", "status, deadline")
+    create_index(engine, "ix_tasks_updated_at_id", "tasks", "updated_at, id")
+    create_index(engine, "ix_tasks_department_status", "tasks", "department, status")
+    create_index(engine, "ix_tasks_telegram_id_created_at", "tasks", "telegram_id, created_at")
+    create_index(engine, "ix_responses_request_id", "responses", "request_id")
+    if engine.dialect.name == "postgresql":
+        with engine.begin() as conn:
+            conn.exec_driver_sql("ANALYZE tasks")
+            conn.exec_driver_sql("ANALYZE responses")
+
+
+@migration(6, "near-duplicate index")
+def _dedup(engine):
+    # parent_id для баз, созданных до dedup.py; таблицы подписей и корзин
+    columns = {"tasks": "INTEGER REFERENCES tasks(id) ON DELETE SET NULL", "tasks_archive": "INTEGER"}
+    for table, column in columns.items():
+        if not _has_column(engine, table, "parent_id"):
+            with engine.begin() as conn:
+                conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN parent_id {column}")
+    models.Base.metadata.create_all(
+        bind=engine, tables=[models.TaskSignature.__table__, models.TaskLshBucket.__table__],
+    )
+    create_index(engine, "ix_tasks_parent_id", "tasks", "parent_id")
+
+
+@migration(7, "task_stats.updated_at")
+def _stats_revision(engine):
+    # Ревизия счётчиков для ETag /stats; существующие строки получают текущее время
+    if not _has_column(engine, "task_stats", "updated_at"):
+        with engine.begin() as conn:
+            conn.exec_driver_sql("ALTER TABLE task_stats ADD COLUMN updated_at TIMESTAMP")
+            conn.execute(text("UPDATE task_stats SET updated_at = :now"), {"now": datetime.utcnow()})
+
+
+@migration(8, "near-duplicate signatures mod 2^31-1")
+def _dedup_signatures(engine):
+    # Хэш-функция MinHash сменилась (numpy): подписи и корзины корней пересчитываются из текста
+    with Session(engine) as db:
+        dedup.rebuild(db)
+
+
+@migration(9, "data version counter")
+def _data_version(engine):
+    # Версия данных для ETag и ?since= (versions.py); существующие строки — версия 0
+    models.DataVersion.__table__.create(bind=engine, checkfirst=True)
+    for table in ("tasks", "task_tombstones"):
+        if not _has_column(engine, table, "version"):
+            with engine.begin() as conn:
+                conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN version BIGINT NOT NULL DEFAULT 0")
+    with engine.begin() as conn:
+        known = set(conn.execute(select(models.DataVersion.name)).scalars())
+        for name, value in ((versions.DATA, 1), (versions.PRUNED, 0)):
+            if name not in known:
+                conn.execute(models.DataVersion.__table__.insert().values(
+                    name=name, value=value, changed_at=datetime.utcnow(),
+                ))
+    create_index(engine, "ix_tasks_version_id", "tasks", "version, id")
+    create_index(engine, "ix_task_tombstones_version", "task_tombstones", "version")
+
+
+def applied_versions(engine):
+    models.SchemaMigration.__table__.create(bind=engine, checkfirst=True)
+    with engine.connect() as conn:
+        return set(conn.execute(select(models.SchemaMigration.version)).scalars())
+
+
+def pending(engine):
+    done = applied_versions(engine)
+    return [(version, name, fn) for version, name, fn in sorted(MIGRATIONS) if version not in done]
+
+
+# Применить недостающие миграции по порядку; возвращает номера применённых
+def migrate(engine):
+    lock = None
+    if engine.dialect.name == "postgresql":
+        lock = engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+        lock.execute(text("SELECT pg_advisory_lock(:key)"), {"key": _LOCK_KEY})
+    try:
+        applied = []
+        for version, name, fn in pending(engine):  # после ожидания блокировки — заново
+            logger.info("Applying migration %d: %s", version, name)
+            fn(engine)
+            with engine.begin() as conn:
+                conn.execute(models.SchemaMigration.__table__.insert().values(
+                    version=version, name=name, applied_at=datetime.utcnow(),
+                ))
+            applied.append(version)
+        return applied
+    finally:
+        if lock is not None:
+            lock.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": _LOCK_KEY})
+            lock.close()
+
+
+if __name__ == "__main__":
+    from .database import engine
+
+    if sys.argv[1:] == ["status"]:
+        done = applied_versions(engine)
+        for version, name, _ in sorted(MIGRATIONS):
+            print(f"{version:4d}  {'applied' if version in done else 'pending'}  {name}")
+    elif sys.argv[1:]:
+        sys.exit("usage: python -m backend.app.migrations [status]")
+    else:
+        logging.basicConfig(level=logging.INFO)
+        print("applied:", migrate(engine) or "nothing to do")
@@ -1,9 +1,18 @@
-from sqlalchemy import Column, String, Integer, DateTime, Enum, ForeignKey
+from sqlalchemy import (Column, String, Integer, BigInteger, Float, DateTime, Enum, ForeignKey,
+                        Index, LargeBinary, Sequence)
 from sqlalchemy.orm import relationship
 from .database import Base
 from datetime import datetime
 import enum
 
+# Последовательность номеров кодов обращений (см. codes.py). Начинаем с 10000, чтобы не
+# пересечься со старыми случайными четырёхзначными кодами FM-<год>-1000..9999.
+CODE_START = 10000
+# Постоянная: шаг task_code_seq задаётся один раз при создании последовательности,
+# блок другого размера пересёкся бы с блоками других воркеров
+CODE_BLOCK_SIZE = 100
+task_code_seq = Sequence("task_code_seq", start=CODE_START, increment=CODE_BLOCK_SIZE, metadata=Base.metadata)
+
 class StatusEnum(str, enum.Enum):
     in_progress = "в процессе"
     done = "выполнена"
@@ -13,6 +22,11 @@ class RequestType(str, enum.Enum):
     complaint = "жалоба"
     idea = "идея"
 
+class OutboxStatus(str, enum.Enum):
+    pending = "pending"
+    sent = "sent"
+    failed = "failed"
+
 class Task(Base):
     __tablename__ = "tasks"
 
@@ -23,6 +37,9 @@ class Task(Base):
     status = Column(Enum(StatusEnum), default=StatusEnum.in_progress)
     type = Column(Enum(RequestType), default=RequestType.complaint)  # 🆕 Тип запроса
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Версия данных (versions.py), с которой строка изменилась последний раз — для ?since=
+    version = Column(BigInteger, nullable=False, default=0, server_default="0")
     deadline = Column(DateTime)
     
     telegram_id = Column(String, nullable=True)
@@ -30,16 +47,155 @@ class Task(Base):
     full_name = Column(String, nullable=True)
 
     reply = Column(String, nullable=True)
+    # Почти-дубликат (dedup.py): корневая задача кластера, к которой присоединено обращение
+    parent_id = Column(Integer, ForeignKey("tasks.id", ondelete="SET NULL"), nullable=True, index=True)
 
     responses = relationship("Response", back_populates="task")  # связь
 
+    __table_args__ = (
+        # Keyset-пагинация списка: ORDER BY created_at DESC, id DESC
+        Index("ix_tasks_created_at_id", "created_at", "id"),
+        # Фоновый поиск просроченных: WHERE status = ... AND deadline < now
+        Index("ix_tasks_status_deadline", "status", "deadline"),
+        # Архивация: WHERE status = ... AND updated_at < ...
+        Index("ix_tasks_updated_at_id", "updated_at", "id"),
+        # Дельта-синхронизация: WHERE (version, id) > токен ORDER BY version, id
+        Index("ix_tasks_version_id", "version", "id"),
+        # Фильтры панели и статистика с фильтрами: WHERE department = ... AND status = ...
+        Index("ix_tasks_department_status", "department", "status"),
+        # Обращения одного жителя: WHERE telegram_id = ... ORDER BY created_at DESC
+        Index("ix_tasks_telegram_id_created_at", "telegram_id", "created_at"),
+    )
+
+# Следы удалённых задач для дельта-синхронизации (GET /tasks?since=); чистит sweeper
+class TaskTombstone(Base):
+    __tablename__ = "task_tombstones"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)  # id удалённой задачи
+    code = Column(String, nullable=True)
+    deleted_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+    version = Column(BigInteger, nullable=False, default=0, server_default="0", index=True)
+
 class Response(Base):
     __tablename__ = "responses"
 
     id = Column(Integer, primary_key=True)
-    request_id = Column(Integer, ForeignKey("tasks.id"))
+    request_id = Column(Integer, ForeignKey("tasks.id"), index=True)  # ответы пачки задач: WHERE request_id IN (...)
     text = Column(String, nullable=False)
     sent_by = Column(String, nullable=True)
     sent_at = Column(DateTime, default=datetime.utcnow)
 
     task = relationship("Task", back_populates="responses")
+
+# Архив выполненных задач (archive.py): сюда переносятся закрытые давно задачи, в tasks остаётся
+# рабочий набор. В Postgres архив секционирован по месяцу created_at (секции создаёт архиватор),
+# поэтому ключ включает created_at, а code — обычный индекс (уникальность по всем секциям не нужна:
+# коды и так уникальны при выдаче).
+class TaskArchive(Base):
+    __tablename__ = "tasks_archive"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    created_at = Column(DateTime, primary_key=True)
+    code = Column(String, index=True)
+    content = Column(String, nullable=False)
+    department = Column(String, nullable=False)
+    status = Column(Enum(StatusEnum))
+    type = Column(Enum(RequestType))
+    updated_at = Column(DateTime)
+    deadline = Column(DateTime)
+    telegram_id = Column(String, nullable=True)
+    username = Column(String, nullable=True)
+    full_name = Column(String, nullable=True)
+    reply = Column(String, nullable=True)
+    parent_id = Column(Integer, nullable=True)
+    archived_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        Index("ix_tasks_archive_created_at_id", "created_at", "id"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+
+# Ответы архивных задач; секция — по месяцу создания задачи, чтобы задача и её ответы лежали рядом
+class ResponseArchive(Base):
+    __tablename__ = "responses_archive"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    task_created_at = Column(DateTime, primary_key=True)
+    request_id = Column(Integer, nullable=False, index=True)
+    text = Column(String, nullable=False)
+    sent_by = Column(String, nullable=True)
+    sent_at = Column(DateTime)
+
+    __table_args__ = (
+        {"postgresql_partition_by": "RANGE (task_created_at)"},
+    )
+
+# MinHash-подписи недавних корневых обращений и LSH-корзины для поиска почти-дубликатов (dedup.py).
+# Кандидаты ищутся по первичному ключу корзин — без просмотра всех задач; старше окна чистит sweeper.
+class TaskSignature(Base):
+    __tablename__ = "task_signatures"
+
+    task_id = Column(Integer, ForeignKey("tasks.id", ondelete="CASCADE"), primary_key=True)
+    signature = Column(LargeBinary, nullable=False)
+    created_at = Column(DateTime, nullable=False, index=True)
+
+class TaskLshBucket(Base):
+    __tablename__ = "task_lsh_buckets"
+
+    bucket = Column(BigInteger, primary_key=True)  # хэш полосы подписи вместе с её номером
+    task_id = Column(Integer, ForeignKey("tasks.id", ondelete="CASCADE"), primary_key=True)
+
+# Счётчики для /stats и /stats/full, обновляются в тех же транзакциях, что и tasks
+class TaskStat(Base):
+    __tablename__ = "task_stats"
+
+    department = Column(String, primary_key=True)
+    status = Column(Enum(StatusEnum), primary_key=True)
+    type = Column(Enum(RequestType), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+    hours_total = Column(Float, nullable=False, default=0)  # сумма (deadline - created_at), ч
+    # Время последнего изменения счётчика
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+# Исходящие сообщения в Telegram: пишутся в транзакции ответа, отправляются фоном (outbox.py)
+class Outbox(Base):
+    __tablename__ = "outbox"
+
+    id = Column(Integer, primary_key=True)
+    task_id = Column(Integer, ForeignKey("tasks.id", ondelete="SET NULL"), nullable=True)
+    chat_id = Column(String, nullable=False)
+    text = Column(String, nullable=False)
+    status = Column(Enum(OutboxStatus), default=OutboxStatus.pending, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    sent_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        # Выборка диспетчера: WHERE status = 'pending' AND next_attempt_at <= now
+        Index("ix_outbox_status_next_attempt", "status", "next_attempt_at"),
+    )
+
+# Счётчик кодов для БД без последовательностей (SQLite)
+class CodeCounter(Base):
+    __tablename__ = "code_counters"
+
+    name = Column(String, primary_key=True)
+    value = Column(Integer, nullable=False)
+
+# Монотонные счётчики версии данных (versions.py): "data" и "tombstones_pruned"
+class DataVersion(Base):
+    __tablename__ = "data_version"
+
+    name = Column(String, primary_key=True)
+    value = Column(BigInteger, nullable=False, default=0)
+    changed_at = Column(DateTime, nullable=True)
+
+# Применённые миграции схемы (migrations.py)
+class SchemaMigration(Base):
+    __tablename__ = "schema_migrations"
+
+    version = Column(Integer, primary_key=True, autoincrement=False)
+    name = Column(String, nullable=False)
+    applied_at = Column(DateTime, default=datetime.utcnow, nullable=False)
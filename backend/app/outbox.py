@@ -0,0 +1,199 @@
+import asyncio
+import logging
+import os
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from . import metrics, models
+from .database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "1"))  # сек, 0 — диспетчер выключен
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "50"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_LEASE_SECONDS = 60  # на это время взятое сообщение скрыто от других воркеров
+
+# Лимиты Telegram: ~30 сообщений/с всего и не чаще 1 сообщения/с в один чат
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", "30"))
+TELEGRAM_CHAT_INTERVAL = float(os.getenv("TELEGRAM_CHAT_INTERVAL", "1"))
+
+
+class TelegramSender:
+    def __init__(self, token: str):
+        self.token = token
+        self._bot = None
+
+    async def send(self, chat_id: str, text: str):
+        if self._bot is None:
+            from telegram import Bot
+            self._bot = Bot(token=self.token)
+        await self._bot.send_message(chat_id=chat_id, text=text)
+
+
+# Локальная замена бота для тестов и разработки: ничего не отправляет, только запоминает
+class FakeSender:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, chat_id: str, text: str):
+        self.sent.append((chat_id, text))
+
+
+_sender = None
+
+
+# OUTBOX_SENDER=fake — без Telegram (нагрузочные прогоны, локальная разработка)
+def get_sender():
+    global _sender
+    if _sender is None:
+        if os.getenv("OUTBOX_SENDER") == "fake":
+            _sender = FakeSender()
+        else:
+            _sender = TelegramSender(os.getenv("BOT_TOKEN"))
+    return _sender
+
+
+def set_sender(sender):
+    global _sender
+    _sender = sender
+
+
+class RateLimiter:
+    def __init__(self, global_rate: float = TELEGRAM_GLOBAL_RATE, chat_interval: float = TELEGRAM_CHAT_INTERVAL):
+        self.global_interval = 1 / global_rate
+        self.chat_interval = chat_interval
+        self._global_lock = asyncio.Lock()
+        self._global_next = 0.0
+        self._chat_locks = defaultdict(asyncio.Lock)
+        self._chat_next = {}
+
+    async def acquire(self, chat_id: str):
+        loop = asyncio.get_running_loop()
+        # Блокировка на чат сохраняет порядок сообщений в одном чате
+        async with self._chat_locks[chat_id]:
+            delay = self._chat_next.get(chat_id, 0.0) - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._chat_next[chat_id] = loop.time() + self.chat_interval
+        async with self._global_lock:
+            delay = self._global_next - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._global_next = max(loop.time(), self._global_next) + self.global_interval
+        self._prune(loop.time())
+
+    def _prune(self, now: float):
+        if len(self._chat_next) < 10000:
+            return
+        for chat_id, next_at in list(self._chat_next.items()):
+            lock = self._chat_locks.get(chat_id)
+            if next_at < now and lock is not None and not lock.locked():
+                del self._chat_next[chat_id]
+                del self._chat_locks[chat_id]
+
+
+def _backoff(attempts: int) -> timedelta:
+    return timedelta(seconds=min(5 * 2 ** (attempts - 1), 3600))
+
+
+# Забрать пачку готовых к отправке сообщений и "арендовать" их
+def claim_batch(limit: int = OUTBOX_BATCH_SIZE):
+    Outbox = models.Outbox
+    now = datetime.utcnow()
+    db = SessionLocal()
+    try:
+        rows = (
+            db.query(Outbox)
+            .filter(Outbox.status == models.OutboxStatus.pending, Outbox.next_attempt_at <= now)
+            .order_by(Outbox.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+        batch = [(row.id, row.chat_id, row.text) for row in rows]
+        for row in rows:
+            row.next_attempt_at = now + timedelta(seconds=OUTBOX_LEASE_SECONDS)
+        db.commit()
+        return batch
+    finally:
+        db.close()
+
+
+def record_result(message_id: int, error: Exception = None):
+    db = SessionLocal()
+    try:
+        row = db.query(models.Outbox).filter(models.Outbox.id == message_id).first()
+        if row is None:
+            return
+        row.attempts += 1
+        if error is None:
+            row.status = models.OutboxStatus.sent
+            row.sent_at = datetime.utcnow()
+            row.last_error = None
+        else:
+            row.last_error = f"{type(error).__name__}: {error}"[:500]
+            if row.attempts >= OUTBOX_MAX_ATTEMPTS:
+                row.status = models.OutboxStatus.failed
+            else:
+                # Telegram сам сообщает, сколько ждать, при превышении лимита (RetryAfter)
+                retry_after = getattr(error, "retry_after", None)
+                if isinstance(retry_after, timedelta):
+                    delay = retry_after
+                elif retry_after:
+                    delay = timedelta(seconds=float(retry_after))
+                else:
+                    delay = _backoff(row.attempts)
+                row.next_attempt_at = datetime.utcnow() + delay
+        db.commit()
+    finally:
+        db.close()
+
+
+async def _deliver(message, limiter: RateLimiter):
+    message_id, chat_id, text = message
+    error = None
+    try:
+        await limiter.acquire(chat_id)
+        start = time.perf_counter()  # без ожидания лимитера: только сам вызов Telegram
+        try:
+            await get_sender().send(chat_id, text)
+        except Exception:
+            metrics.TELEGRAM_SEND.observe(time.perf_counter() - start, "error")
+            raise
+        metrics.TELEGRAM_SEND.observe(time.perf_counter() - start, "ok")
+    except Exception as e:
+        error = e
+        logger.warning("Outbox message %d to chat %s failed: %s", message_id, chat_id, e)
+    await asyncio.to_thread(record_result, message_id, error)
+
+
+# Поднимается в lifespan приложения; wake() будит его сразу после нового ответа
+_wakeup = None
+_loop = None
+
+
+def wake():
+    if _loop is not None and _wakeup is not None:
+        _loop.call_soon_threadsafe(_wakeup.set)
+
+
+async def run_outbox_dispatcher(interval: float = OUTBOX_POLL_INTERVAL):
+    global _wakeup, _loop
+    _loop = asyncio.get_running_loop()
+    _wakeup = asyncio.Event()
+    limiter = RateLimiter()
+    while True:
+        batch = []
+        try:
+            batch = await asyncio.to_thread(claim_batch)
+            if batch:
+                await asyncio.gather(*(_deliver(message, limiter) for message in batch))
+        except Exception:
+            logger.exception("Outbox dispatch failed")
+        if len(batch) < OUTBOX_BATCH_SIZE:
+            try:
+                await asyncio.wait_for(_wakeup.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+            _wakeup.clear()
@@ -0,0 +1,47 @@
+import os
+from .cache import LRUCache
+
+# Готовые PDF: ключ — параметры отчёта, значение — (версия данных, байты PDF)
+report_cache = LRUCache(
+    max_entries=int(os.getenv("REPORT_CACHE_ENTRIES", "64")),
+    max_bytes=int(os.getenv("REPORT_CACHE_MAX_BYTES", str(32 * 1024 * 1024))),
+)
+
+
+def render_stats_report(stats: dict) -> bytes:
+    from fpdf import FPDF, FPDF_VERSION  # ~0.5 с на импорт — только при первом отчёте
+
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_font("Arial", size=12)
+    pdf.cell(200, 10, txt="📄 Отчёт по обращениям", ln=True, align="C")
+    pdf.ln(10)
+
+    for dept, data in stats.items():
+        pdf.set_font("Arial", "B", size=12)
+        pdf.cell(0, 10, f"{dept}:", ln=True)
+        pdf.set_font("Arial", size=11)
+        pdf.cell(0, 8, f"  Всего: {data['total']}", ln=True)
+        pdf.cell(0, 8, f"  Выполнено: {data['done']}", ln=True)
+        pdf.cell(0, 8, f"  В процессе: {data['in_progress']}", ln=True)
+        pdf.cell(0, 8, f"  Просрочено: {data['overdue']}", ln=True)
+        pdf.cell(0, 8, f"  Среднее время: {data['avg_hours']} ч", ln=True)
+        pdf.ln(5)
+
+    # PyFPDF 1.x отдаёт строку latin-1 через dest="S", fpdf2 — bytearray из output()
+    if FPDF_VERSION.startswith("1."):
+        return pdf.output(dest="S").encode("latin-1")
+    return bytes(pdf.output())
+
+
+# PDF из кэша, если номер версии данных (crud.get_data_version) для этих
+# параметров не изменился: попадание обходится без запросов статистики и без рендера
+def cached_report(key, version):
+    cached = report_cache.get(key)
+    if cached and cached[0] == version:
+        return cached[1]
+    return None
+
+
+def store_report(key, version, pdf: bytes):
+    report_cache.set(key, (version, pdf), size=len(pdf))
@@ -1,17 +1,26 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, field_validator
 from datetime import datetime
 from typing import Optional, List
 from .models import StatusEnum, RequestType
+from .stats import _naive_utc
+
+
+# Колонки TIMESTAMP без часового пояса: время с зоной (…+05:00, …Z) приводится к наивному UTC,
+# иначе asyncpg отвергает параметр (DataError), а сравнение с наивными значениями падает
+def _naive(value):
+    return _naive_utc(value) if value is not None else None
 
 class TaskCreate(BaseModel):
     content: str
-    department: str
+    department: Optional[str] = None  # пусто — отдел определяется по ключевым словам
     deadline: datetime
     telegram_id: Optional[str] = None
     username: Optional[str] = None
     full_name: Optional[str] = None
     type: Optional[RequestType] = RequestType.complaint  # по умолчанию "жалоба"
 
+    _naive_deadline = field_validator("deadline")(_naive)
+
 class TaskUpdate(BaseModel):
     status: StatusEnum
 
@@ -25,6 +34,26 @@ class ResponseOut(BaseModel):
     class Config:
         from_attributes = True
 
+# Облегчённая строка для табличного вида: только колонки, которые рисует панель
+class TaskSummaryOut(BaseModel):
+    id: int
+    code: Optional[str]
+    content: str
+    department: str
+    status: StatusEnum
+    type: RequestType
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+    deadline: datetime
+    telegram_id: Optional[str] = None
+    reply: Optional[str] = None
+    parent_id: Optional[int] = None  # задача-родитель, если обращение — почти-дубликат
+
+    _naive_deadline = field_validator("deadline")(_naive)
+
+    class Config:
+        from_attributes = True
+
 class TaskOut(BaseModel):
     id: int
     code: Optional[str]
@@ -33,12 +62,72 @@ class TaskOut(BaseModel):
     status: StatusEnum
     type: RequestType
     created_at: datetime
+    updated_at: Optional[datetime] = None
     deadline: datetime
     telegram_id: Optional[str] = None
     username: Optional[str] = None
     full_name: Optional[str] = None
     reply: Optional[str] = None
+    parent_id: Optional[int] = None
     responses: Optional[List[ResponseOut]] = []
 
+    _naive_deadline = field_validator("deadline")(_naive)
+
     class Config:
         from_attributes = True
+
+class TaskFilter(BaseModel):
+    department: Optional[str] = None
+    status: Optional[StatusEnum] = None
+    type: Optional[RequestType] = None
+    created_from: Optional[datetime] = None
+    created_to: Optional[datetime] = None
+    deadline_from: Optional[datetime] = None
+    deadline_to: Optional[datetime] = None
+    code_prefix: Optional[str] = None
+    telegram_id: Optional[str] = None  # обращения одного жителя
+    cluster_id: Optional[int] = None  # кластер почти-дубликатов: сама задача и присоединённые к ней
+
+    _naive_dates = field_validator("created_from", "created_to", "deadline_from", "deadline_to")(_naive)
+
+# Выбор задач для пакетных операций (PATCH/DELETE /tasks/bulk): список id или фильтр
+class TaskSelection(BaseModel):
+    ids: Optional[List[int]] = None
+    filter: Optional[TaskFilter] = None
+
+class TaskBulkUpdate(TaskSelection):
+    status: StatusEnum
+
+class TaskSummaryPage(BaseModel):
+    items: List[TaskSummaryOut]
+    next_cursor: Optional[str] = None  # None — страниц больше нет
+
+class TaskPage(BaseModel):
+    items: List[TaskOut]
+    next_cursor: Optional[str] = None
+
+# Изменения с момента токена since: изменённые строки и id удалённых задач
+class TaskDelta(BaseModel):
+    items: List[TaskSummaryOut]
+    deleted: List[int]
+    next_since: str  # передать в следующий запрос ?since=
+    has_more: bool = False  # True — запросить сразу ещё раз с next_since
+
+class SearchHit(BaseModel):
+    task: TaskSummaryOut
+    rank: float
+    snippet: str  # фрагмент content, совпадения обёрнуты в <mark>
+
+class SearchPage(BaseModel):
+    items: List[SearchHit]
+    next_offset: Optional[int] = None
+
+# Кластер почти-дубликатов: корневая задача и число присоединённых к ней обращений
+class ClusterOut(BaseModel):
+    task: TaskSummaryOut
+    duplicates: int
+    last_at: datetime  # когда присоединилось последнее обращение
+
+class ClusterPage(BaseModel):
+    items: List[ClusterOut]
+    next_offset: Optional[int] = None
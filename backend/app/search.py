@@ -0,0 +1,130 @@
+import re
+from sqlalchemy import select, func, or_, literal, literal_column, table, column, text
+from sqlalchemy.orm import Session
+from . import models, keywords
+from .crud import SUMMARY_COLUMNS
+
+# Поиск по содержанию и коду обращений.
+# Postgres: GIN-индекс полнотекстового поиска (конфигурация russian) по content
+# и триграммные GIN-индексы (pg_trgm) по content и code для нечёткого совпадения.
+# SQLite (локальные запуски и тесты): внешняя FTS5-таблица tasks_fts, которую ведут триггеры.
+
+_POSTGRES_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+]
+# GIN-индексы строит миграция через migrations.create_index — CONCURRENTLY, без блокировки записи
+POSTGRES_INDEXES = [
+    ("ix_tasks_content_fts", "to_tsvector('russian', content)"),
+    ("ix_tasks_content_trgm", "content gin_trgm_ops"),
+    ("ix_tasks_code_trgm", "code gin_trgm_ops"),
+]
+
+_SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5("
+    "content, content='tasks', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS tasks_fts_ai AFTER INSERT ON tasks BEGIN "
+    "INSERT INTO tasks_fts(rowid, content) VALUES (new.id, new.content); END",
+    "CREATE TRIGGER IF NOT EXISTS tasks_fts_ad AFTER DELETE ON tasks BEGIN "
+    "INSERT INTO tasks_fts(tasks_fts, rowid, content) VALUES ('delete', old.id, old.content); END",
+    "CREATE TRIGGER IF NOT EXISTS tasks_fts_au AFTER UPDATE OF content ON tasks BEGIN "
+    "INSERT INTO tasks_fts(tasks_fts, rowid, content) VALUES ('delete', old.id, old.content); "
+    "INSERT INTO tasks_fts(rowid, content) VALUES (new.id, new.content); END",
+]
+
+_HEADLINE_OPTIONS = "StartSel=<mark>, StopSel=</mark>, MaxFragments=2, MaxWords=20, MinWords=5"
+_RUSSIAN = literal_column("'russian'")  # литерал, а не параметр: иначе планировщик не узнает индекс
+_CODE_RE = re.compile(r"^fm-?\d*(-\d*)?$", re.IGNORECASE)
+
+
+def ensure_search_schema(engine):
+    dialect = engine.dialect.name
+    with engine.begin() as conn:
+        if dialect == "postgresql":
+            for ddl in _POSTGRES_DDL:
+                conn.exec_driver_sql(ddl)
+        elif dialect == "sqlite":
+            existed = conn.exec_driver_sql(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'tasks_fts'"
+            ).first()
+            for ddl in _SQLITE_DDL:
+                conn.exec_driver_sql(ddl)
+            if not existed:
+                conn.exec_driver_sql("INSERT INTO tasks_fts(tasks_fts) VALUES ('rebuild')")
+
+
+def _postgres_query(q: str, limit: int, offset: int):
+    Task = models.Task
+    tsv = func.to_tsvector(_RUSSIAN, Task.content)
+    tsq = func.websearch_to_tsquery(_RUSSIAN, q)
+    rank = func.greatest(
+        func.ts_rank(tsv, tsq),
+        func.word_similarity(q, Task.content),
+        func.similarity(Task.code, q),
+    )
+    hits = (
+        select(Task.id, rank.label("rank"))
+        .where(or_(
+            tsv.op("@@")(tsq),
+            literal(q).op("<%")(Task.content),  # нечёткое совпадение слова, pg_trgm
+            Task.code.op("%")(q),
+        ))
+        .order_by(rank.desc(), Task.id.desc())
+        .limit(limit)
+        .offset(offset)
+        .subquery()
+    )
+    # Подсветка считается только для строк текущей страницы
+    snippet = func.ts_headline(_RUSSIAN, Task.content, tsq, literal_column(f"'{_HEADLINE_OPTIONS}'"))
+    return (
+        select(*SUMMARY_COLUMNS, hits.c.rank, snippet.label("snippet"))
+        .join(hits, hits.c.id == Task.id)
+        .order_by(hits.c.rank.desc(), Task.id.desc())
+    )
+
+
+def _fts5_match(q: str):
+    # Каждое слово — префиксный поиск по основе: "дорогами" найдёт "дорога", "дороги"
+    words = [keywords.stem(w) for w in re.findall(r"\w+", q.lower().replace("ё", "е"))]
+    return " ".join(f'"{w}"*' for w in words if w)
+
+
+def _sqlite_query(q: str, limit: int, offset: int):
+    Task = models.Task
+    if _CODE_RE.match(q):
+        return (
+            select(*SUMMARY_COLUMNS, literal(1.0).label("rank"), func.substr(Task.content, 1, 160).label("snippet"))
+            .where(Task.code.startswith(q.upper(), autoescape=True))
+            .order_by(Task.code)
+            .limit(limit)
+            .offset(offset)
+        )
+    match = _fts5_match(q)
+    if not match:
+        return None
+    fts = table("tasks_fts", column("rowid"))
+    return (
+        select(
+            *SUMMARY_COLUMNS,
+            literal_column("-bm25(tasks_fts)").label("rank"),
+            literal_column("snippet(tasks_fts, 0, '<mark>', '</mark>', '…', 16)").label("snippet"),
+        )
+        .select_from(fts.join(Task, Task.id == fts.c.rowid))
+        .where(text("tasks_fts MATCH :match").bindparams(match=match))
+        .order_by(literal_column("rank").desc(), Task.id.desc())
+        .limit(limit)
+        .offset(offset)
+    )
+
+
+# Ранжированные результаты: [(строка с колонками TaskSummaryOut, rank, snippet)]
+def search_tasks(db: Session, q: str, limit: int = 20, offset: int = 0):
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        query = _postgres_query(q, limit, offset)
+    elif dialect == "sqlite":
+        query = _sqlite_query(q, limit, offset)
+    else:
+        raise NotImplementedError(f"search is not supported on {dialect}")
+    if query is None:
+        return []
+    return db.execute(query).all()
@@ -0,0 +1,203 @@
+import sys
+from collections import defaultdict
+from datetime import datetime, timezone
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from . import models, versions
+
+# Инкрементальные счётчики task_stats: (department, status, type) -> count, hours_total.
+# Все изменения делаются в транзакции вызывающего кода, commit — на его стороне.
+
+
+# Длительность задачи в часах (deadline - created_at), вычисляется в БД
+def hours_between(db: Session, start, end):
+    if db.get_bind().dialect.name == "sqlite":
+        return (func.julianday(end) - func.julianday(start)) * 24
+    return func.extract("epoch", end - start) / 3600
+
+
+def _naive_utc(value):
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def hours_span(start, end):
+    if start and end:
+        return (_naive_utc(end) - _naive_utc(start)).total_seconds() / 3600
+    return 0.0
+
+
+def task_hours(task):
+    return hours_span(task.created_at, task.deadline)
+
+
+def _insert_for(db: Session):
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    return insert
+
+
+# Атомарно прибавить delta к счётчику (upsert)
+def bump(db: Session, department, status, type, delta: int = 1, hours: float = 0.0):
+    Stat = models.TaskStat
+    type = type or models.RequestType.complaint
+    insert = _insert_for(db)
+    if insert is None:
+        row = db.get(Stat, (department, status, type), with_for_update=True)
+        if row is None:
+            db.add(Stat(department=department, status=status, type=type, count=delta, hours_total=hours))
+        else:
+            row.count += delta
+            row.hours_total += hours
+        return
+    stmt = insert(Stat).values(
+        department=department, status=status, type=type, count=delta, hours_total=hours,
+        updated_at=datetime.utcnow(),
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Stat.department, Stat.status, Stat.type],
+        set_={
+            "count": Stat.count + stmt.excluded.count,
+            "hours_total": Stat.hours_total + stmt.excluded.hours_total,
+            "updated_at": stmt.excluded.updated_at,
+        },
+    )
+    db.execute(stmt)
+
+
+def bump_task(db: Session, task, delta: int = 1, status=None):
+    bump(db, task.department, status or task.status, task.type, delta, delta * task_hours(task))
+
+
+# Пачка строк задач (department, type, created_at, deadline и status, если он не задан):
+# один bump на (отдел, статус, тип)
+def bump_rows(db: Session, rows, delta: int, status=None):
+    grouped = {}
+    for row in rows:
+        key = (row.department, status or row.status, row.type)
+        count, hours = grouped.get(key, (0, 0.0))
+        grouped[key] = (count + 1, hours + task_hours(row))
+    for (department, row_status, type), (count, hours) in grouped.items():
+        bump(db, department, row_status, type, delta * count, delta * hours)
+
+
+# Точные значения счётчиков, посчитанные по самой таблице tasks
+def _expected(db: Session):
+    Task = models.Task
+    type_ = func.coalesce(Task.type, models.RequestType.complaint)
+    hours = hours_between(db, Task.created_at, Task.deadline)
+    rows = (
+        db.query(
+            Task.department, Task.status, type_,
+            func.count(Task.id),
+            func.coalesce(func.sum(hours), 0),
+        )
+        .group_by(Task.department, Task.status, type_)
+        .all()
+    )
+    return {(d, s, t): (count, float(hours)) for d, s, t, count, hours in rows}
+
+
+# Пересчитать task_stats с нуля; возвращает список расхождений до пересчёта
+def reconcile(db: Session):
+    Stat = models.TaskStat
+    if db.get_bind().dialect.name == "postgresql":
+        # Блокируем инкременты на время пересчёта, иначе они потеряются
+        db.connection().exec_driver_sql("LOCK TABLE task_stats IN EXCLUSIVE MODE")
+    expected = _expected(db)
+    actual = {
+        (r.department, r.status, r.type): (r.count, r.hours_total)
+        for r in db.query(Stat).all()
+    }
+
+    drift = []
+    for key in expected.keys() | actual.keys():
+        exp_count, exp_hours = expected.get(key, (0, 0.0))
+        act_count, act_hours = actual.get(key, (0, 0.0))
+        if exp_count != act_count or abs(exp_hours - act_hours) > 0.01:
+            department, status, type = key
+            drift.append({
+                "department": department,
+                "status": status.value,
+                "type": type.value,
+                "expected": exp_count,
+                "actual": act_count,
+            })
+
+    db.query(Stat).delete(synchronize_session=False)
+    db.add_all(
+        Stat(department=d, status=s, type=t, count=count, hours_total=hours)
+        for (d, s, t), (count, hours) in expected.items()
+    )
+    versions.bump(db)  # счётчики изменились без событий задач — ETag /stats тоже должен смениться
+    db.commit()
+    return drift
+
+
+# Чтение счётчиков: {department: {status: (count, hours_total)}}
+def _by_department(db: Session):
+    Stat = models.TaskStat
+    rows = (
+        db.query(Stat.department, Stat.status, func.sum(Stat.count), func.sum(Stat.hours_total))
+        .group_by(Stat.department, Stat.status)
+        .all()
+    )
+    result = defaultdict(dict)
+    for department, status, count, hours in rows:
+        result[department][status] = (count or 0, hours or 0.0)
+    return result
+
+
+def _stats_dict(by_status, with_avg: bool = True):
+    Status = models.StatusEnum
+    counts = {status: by_status.get(status, (0, 0.0))[0] for status in Status}
+    stats = {
+        "total": sum(counts.values()),
+        "done": counts[Status.done],
+        "in_progress": counts[Status.in_progress],
+        "overdue": counts[Status.overdue],
+    }
+    if with_avg:
+        done, hours = by_status.get(Status.done, (0, 0.0))
+        stats["avg_hours"] = round(hours / done, 1) if done else 0
+    return stats
+
+
+def get_task_stats(db: Session):
+    totals = defaultdict(lambda: [0, 0.0])
+    for by_status in _by_department(db).values():
+        for status, (count, hours) in by_status.items():
+            totals[status][0] += count
+            totals[status][1] += hours
+    return _stats_dict({s: tuple(v) for s, v in totals.items()}, with_avg=False)
+
+
+def get_detailed_stats(db: Session):
+    stats = {}
+    for department, by_status in _by_department(db).items():
+        row = _stats_dict(by_status)
+        if row["total"]:
+            stats[department] = row
+    return stats
+
+
+if __name__ == "__main__":
+    # python -m backend.app.stats reconcile
+    if sys.argv[1:] != ["reconcile"]:
+        sys.exit("usage: python -m backend.app.stats reconcile")
+    from .database import SessionLocal
+    db = SessionLocal()
+    try:
+        drift = reconcile(db)
+    finally:
+        db.close()
+    for row in drift:
+        print(f"{row['department']} / {row['status']} / {row['type']}: "
+              f"expected {row['expected']}, was {row['actual']}")
+    print(f"task_stats rebuilt, {len(drift)} counter(s) drifted")
@@ -0,0 +1,40 @@
+import asyncio
+import logging
+import os
+from datetime import datetime
+from . import crud, dedup
+from .database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Интервал фоновой проверки просроченных задач (и чистки старых tombstones и подписей dedup), секунд (0 — отключить)
+OVERDUE_SWEEP_INTERVAL = float(os.getenv("OVERDUE_SWEEP_INTERVAL", "60"))
+
+# Результаты последних прогонов — для логов и мониторинга
+sweep_stats = {"runs": 0, "last_changed": 0, "total_changed": 0, "last_run_at": None}
+
+
+def sweep_overdue():
+    db = SessionLocal()
+    try:
+        changed = crud.mark_overdue_tasks(db)
+        crud.prune_tombstones(db)
+        dedup.prune(db)
+    finally:
+        db.close()
+    sweep_stats["runs"] += 1
+    sweep_stats["last_changed"] = changed
+    sweep_stats["total_changed"] += changed
+    sweep_stats["last_run_at"] = datetime.utcnow()
+    return changed
+
+
+async def run_overdue_sweeper(interval: float = OVERDUE_SWEEP_INTERVAL):
+    while True:
+        try:
+            # UPDATE блокирующий — выполняем вне event loop
+            changed = await asyncio.to_thread(sweep_overdue)
+            logger.info("Overdue sweep: %d task(s) marked overdue", changed)
+        except Exception:
+            logger.exception("Overdue sweep failed")
+        await asyncio.sleep(interval)
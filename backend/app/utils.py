@@ -1,9 +1,27 @@
+import base64
 from datetime import datetime
-from backend.app.models import StatusEnum
-
-def check_overdue(task):
-    if task.status == StatusEnum.done:
-        return task.status
-    if task.deadline < datetime.utcnow():
-        return StatusEnum.overdue
-    return task.status
+
+# Курсор keyset-пагинации: base64 от "created_at|id" последней строки страницы
+def encode_cursor(created_at: datetime, task_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{task_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, task_id = base64.urlsafe_b64decode(padded).decode().split("|")
+        return datetime.fromisoformat(created_at), int(task_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"invalid cursor: {cursor!r}") from e
+
+# Токен дельта-синхронизации: версия данных и id последней отданной строки
+def encode_since(version: int, task_id: int) -> str:
+    return base64.urlsafe_b64encode(f"v{version}|{task_id}".encode()).decode().rstrip("=")
+
+def decode_since(token: str):
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        version, task_id = base64.urlsafe_b64decode(padded).decode().removeprefix("v").split("|")
+        return int(version), int(task_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"invalid since token: {token!r}") from e
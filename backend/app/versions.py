@@ -0,0 +1,64 @@
+from datetime import datetime
+from sqlalchemy import select, insert, update, func
+from sqlalchemy.orm import Session
+from . import models
+
+# Версия данных — монотонный счётчик в строке data_version, а не время изменения.
+# Каждая транзакция с событиями задач (events.py) перед commit увеличивает его и помечает
+# затронутые строки tasks / task_tombstones полученным номером. UPDATE строки счётчика держит
+# её блокировку до commit: следующая транзакция получает номер только после того, как предыдущая
+# закоммичена, поэтому номера видны в порядке commit'ов — без поправок на часы и «перекрытия».
+# Блокировка берётся последней (строки задач транзакция уже заблокировала сама) — без взаимоблокировок.
+# ETag/Last-Modified и кэш PDF сравнивают номер; ?since= — пары (version, id).
+DATA = "data"
+PRUNED = "tombstones_pruned"  # наибольшая версия удалённых sweeper'ом tombstones
+_CHUNK = 2000  # размер IN-списков
+
+
+def _set(db: Session, name: str, value, now: datetime, initial: int):
+    Version = models.DataVersion
+    result = db.execute(
+        update(Version).where(Version.name == name).values(value=value, changed_at=now).returning(Version.value)
+    ).scalar()
+    if result is None:  # база без строки счётчика (создана create_all, без миграции 9)
+        db.execute(insert(Version).values(name=name, value=initial, changed_at=now))
+        result = initial
+    return result
+
+
+# Новый номер версии данных в текущей транзакции
+def bump(db: Session, now: datetime = None) -> int:
+    return _set(db, DATA, models.DataVersion.value + 1, now or datetime.utcnow(), 1)
+
+
+# Пометить строки событий номером версии (вызывается из before_commit events.py)
+def stamp(db: Session, version: int, items):
+    Task, Tombstone = models.Task.__table__, models.TaskTombstone.__table__
+    for table, ids in (
+        (Task, sorted({item["id"] for item in items if item["op"] != "delete"})),
+        (Tombstone, sorted({item["id"] for item in items if item["op"] == "delete"})),
+    ):
+        values = {"version": version}
+        if table is Task:
+            values["updated_at"] = Task.c.updated_at  # onupdate не срабатывает: время изменения не сдвигается
+        for i in range(0, len(ids), _CHUNK):
+            db.execute(update(table).where(table.c.id.in_(ids[i:i + _CHUNK])).values(**values))
+
+
+# (номер, время) текущей версии данных
+def current(db: Session):
+    Version = models.DataVersion
+    row = db.execute(select(Version.value, Version.changed_at).where(Version.name == DATA)).first()
+    return (row.value, row.changed_at) if row else (0, None)
+
+
+def pruned(db: Session) -> int:
+    Version = models.DataVersion
+    return db.scalar(select(Version.value).where(Version.name == PRUNED)) or 0
+
+
+# Отметить, что tombstones до версии version удалены: токены since старше неё устарели
+def mark_pruned(db: Session, version: int):
+    Version = models.DataVersion
+    greatest = func.max if db.get_bind().dialect.name == "sqlite" else func.greatest  # скалярный max в SQLite
+    _set(db, PRUNED, greatest(Version.value, version), datetime.utcnow(), version)
@@ -0,0 +1,127 @@
+import argparse
+import asyncio
+import json
+import random
+import time
+from datetime import datetime, timedelta
+import httpx
+from fastapi import FastAPI, Depends, Query
+from sqlalchemy.orm import Session
+from backend.app import crud, migrations, models, schemas
+from backend.app.database import SessionLocal, engine
+from .classifier import NOISE, percentile
+
+# Сравнение синхронного (def + SessionLocal, пул потоков) и асинхронного (async def + AsyncSession)
+# путей обработки на одних и тех же запросах: запросов в секунду и p50/p99 задержки.
+#   DATABASE_URL=... python -m backend.bench.async_vs_sync [--seed 5000] [--requests 2000] [--concurrency 64]
+# Запускать на отдельной базе: --seed добавляет строки в tasks.
+# Синхронный путь при concurrency больше DB_POOL_SIZE + DB_MAX_OVERFLOW может встать:
+# потоки пула ждут соединений, а закрытие сессии в get_db само ждёт свободный поток.
+
+
+# Синхронный вариант тех же обработчиков, что в main.py до перехода на AsyncSession
+def sync_app() -> FastAPI:
+    app = FastAPI()
+
+    def get_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    @app.get("/tasks")
+    def get_tasks(limit: int = Query(50, ge=1, le=500), db: Session = Depends(get_db)):
+        tasks, next_cursor = crud.get_tasks(db, limit=limit)
+        return schemas.TaskSummaryPage(items=tasks, next_cursor=next_cursor)
+
+    @app.get("/tasks/by-id/{task_id}", response_model=schemas.TaskOut)
+    def get_task(task_id: int, db: Session = Depends(get_db)):
+        return crud.get_task(db, task_id)
+
+    @app.get("/stats/full")
+    def get_full_stats(db: Session = Depends(get_db)):
+        return crud.get_detailed_stats(db)
+
+    return app
+
+
+def async_app() -> FastAPI:
+    from backend.app import crud_async, main
+
+    app = main.create_app()
+
+    # Задача по id без кэша — в main.py такого маршрута нет, code_cache скрыл бы обращение к БД
+    @app.get("/tasks/by-id/{task_id}", response_model=schemas.TaskOut)
+    async def get_task(task_id: int, db=Depends(main.get_db)):
+        return await crud_async.get_task(db, task_id, schema=schemas.TaskOut)
+
+    return app
+
+
+def seed(count: int):
+    rng = random.Random(3)
+    deadline = datetime.utcnow() + timedelta(days=7)
+    db = SessionLocal()
+    try:
+        for start in range(0, count, 1000):
+            crud.create_tasks_bulk(db, [
+                schemas.TaskCreate(content=" ".join(rng.sample(NOISE, 8)), deadline=deadline)
+                for _ in range(min(1000, count - start))
+            ])
+        return [task_id for task_id, in db.query(models.Task.id).limit(10000)]
+    finally:
+        db.close()
+
+
+async def drive(app: FastAPI, paths, requests: int, concurrency: int):
+    latencies, errors = [], 0
+    queue = iter(paths[i % len(paths)] for i in range(requests))
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def worker():
+            nonlocal errors
+            for path in queue:
+                start = time.perf_counter()
+                response = await client.get(path)
+                latencies.append((time.perf_counter() - start) * 1000)
+                errors += response.status_code != 200
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return {
+        "rps": round(requests / elapsed),
+        "p50_ms": round(percentile(latencies, 0.5), 2),
+        "p99_ms": round(percentile(latencies, 0.99), 2),
+        "errors": errors,
+    }
+
+
+async def compare(paths, requests: int, concurrency: int):
+    # Оба прогона в одном цикле событий: пул асинхронного движка привязан к циклу
+    result = {}
+    for name, app in (("sync", sync_app()), ("async", async_app())):
+        await drive(app, paths, min(requests, 100), concurrency)  # прогрев пулов
+        result[name] = await drive(app, paths, requests, concurrency)
+    return result
+
+
+def run(seed_rows: int, requests: int, concurrency: int):
+    migrations.migrate(engine)
+    ids = seed(seed_rows)
+    rng = random.Random(4)
+    paths = ["/tasks?limit=50", "/stats/full"] + [f"/tasks/by-id/{i}" for i in rng.sample(ids, min(len(ids), 200))]
+    rng.shuffle(paths)
+    result = {"requests": requests, "concurrency": concurrency, "database": engine.dialect.name}
+    result.update(asyncio.run(compare(paths, requests, concurrency)))
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sync vs async endpoint benchmark")
+    parser.add_argument("--seed", type=int, default=5000, help="tasks to insert before measuring")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=24)
+    args = parser.parse_args()
+    print(json.dumps(run(args.seed, args.requests, args.concurrency), indent=2))
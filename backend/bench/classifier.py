@@ -0,0 +1,70 @@
+import argparse
+import json
+import random
+import tempfile
+import time
+from backend.app import classifier, keywords
+
+# Бенчмарк классификатора отделов: задержка на один документ и пропускная способность пачкой.
+#   python -m backend.bench.classifier [--model DIR] [--docs 20000] [--batch 1000]
+# Без --model обучает модель на синтетическом корпусе из словаря keywords.json.
+
+NOISE = ("улица дом двор возле около сегодня уже неделю жители просим срочно помогите "
+         "район квартал школа парк вечером утром снова опять нет плохо сломан").split()
+
+
+def synthetic_corpus(n: int, seed: int = 1):
+    rng = random.Random(seed)
+    config = keywords.load_config()
+    departments = list(config["departments"].items())
+    texts, labels = [], []
+    for _ in range(n):
+        dept, entry = rng.choice(departments)
+        words = rng.sample(NOISE, 6) + [rng.choice(entry["terms"])]
+        rng.shuffle(words)
+        texts.append(" ".join(words))
+        labels.append(dept)
+    return texts, labels
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def run(model_dir: str, docs: int, batch: int):
+    texts, _ = synthetic_corpus(docs, seed=2)
+    model = classifier.DepartmentModel(model_dir)
+    model.predict(texts[:10])  # прогрев mmap
+
+    single = []
+    for text in texts[:1000]:
+        start = time.perf_counter()
+        model.predict([text])
+        single.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    for i in range(0, docs, batch):
+        model.predict(texts[i:i + batch])
+    elapsed = time.perf_counter() - start
+
+    return {
+        "docs": docs,
+        "batch_size": batch,
+        "single_doc_ms": {"p50": percentile(single, 0.5), "p99": percentile(single, 0.99)},
+        "batch_docs_per_sec": round(docs / elapsed),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Department classifier benchmark")
+    parser.add_argument("--model", help="artifact directory; trains a synthetic model if omitted")
+    parser.add_argument("--docs", type=int, default=20000)
+    parser.add_argument("--batch", type=int, default=1000)
+    args = parser.parse_args()
+    if args.model:
+        print(json.dumps(run(args.model, args.docs, args.batch), indent=2))
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            classifier.train(*synthetic_corpus(20000), tmp)
+            print(json.dumps(run(tmp, args.docs, args.batch), indent=2))
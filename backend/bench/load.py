@@ -0,0 +1,314 @@
+import argparse
+import asyncio
+import contextvars
+import json
+import random
+import subprocess
+import time
+from datetime import datetime, timedelta
+import httpx
+from sqlalchemy import event, func, insert, select
+from backend.app import codes, keywords, migrations, models, stats
+from backend.app.database import SessionLocal, engine, async_engine
+from .classifier import NOISE, percentile
+
+# Нагрузочный прогон API на отдельной базе (SQLite или одноразовый Postgres из DATABASE_URL).
+#   python -m backend.bench.load seed --tasks 100k --responses 0.5
+#   python -m backend.bench.load run [--requests 500] [--concurrency 16] [--out before.json]
+#   python -m backend.bench.load run --url http://localhost:8000   # сервер с OUTBOX_SENDER=fake
+#   python -m backend.bench.load compare before.json after.json
+# run гоняет по очереди create, list, code, update, stats, stats_full, report и reply и пишет JSON:
+# запросов в секунду, p50/p95/p99 задержки, ошибки и — в режиме in-process — SQL-запросы на запрос.
+# В режиме in-process ответы уходят в FakeSender, в отчёте — сколько из них доставлено.
+
+SCENARIOS = ("create", "list", "list_filtered", "code", "update", "stats", "stats_full", "report", "reply")
+STATUS_WEIGHTS = {models.StatusEnum.done: 55, models.StatusEnum.in_progress: 30, models.StatusEnum.overdue: 15}
+
+
+def parse_count(value: str) -> int:
+    value = value.lower().replace("_", "")
+    for suffix, factor in (("m", 1_000_000), ("k", 1000)):
+        if value.endswith(suffix):
+            return int(float(value[:-1]) * factor)
+    return int(value)
+
+
+# Отделы из словаря с убывающей (Zipf) частотой: первые отделы получают больше обращений
+def _departments():
+    config = keywords.load_config()
+    names = list(config["departments"]) + [config.get("default", "Общие обращения")]
+    return names, [1 / (rank + 1) for rank in range(len(names))]
+
+
+def _text(rng, config):
+    entry = rng.choice(list(config["departments"].values()))
+    words = rng.sample(NOISE, 6) + [rng.choice(entry["terms"])]
+    rng.shuffle(words)
+    return " ".join(words)
+
+
+def _task_row(rng, now, departments, weights, config, days):
+    created = now - timedelta(seconds=rng.randrange(days * 86400))
+    status = rng.choices(list(STATUS_WEIGHTS), list(STATUS_WEIGHTS.values()))[0]
+    deadline = created + timedelta(days=rng.randint(3, 30))
+    if status == models.StatusEnum.in_progress and deadline <= now:
+        deadline = now + timedelta(days=rng.randint(1, 14))
+    elif status == models.StatusEnum.overdue and deadline >= now:
+        deadline = now - timedelta(hours=rng.randint(1, 72))
+        created = min(created, deadline - timedelta(days=3))
+    return {
+        "content": _text(rng, config),
+        "department": rng.choices(departments, weights)[0],
+        "status": status,
+        "type": models.RequestType.idea if rng.random() < 0.15 else models.RequestType.complaint,
+        "created_at": created,
+        "updated_at": created,
+        "deadline": deadline,
+        "telegram_id": str(rng.randrange(10 ** 8, 10 ** 9)) if rng.random() < 0.7 else None,
+        "username": None,
+        "full_name": None,
+        "reply": None,
+    }
+
+
+# Наполнение базы: задачи пачками по batch строк (Core INSERT ... RETURNING), ответы
+# в среднем по responses на задачу, затем пересчёт счётчиков task_stats
+def seed(tasks: int, responses: float = 0.5, days: int = 180, batch: int = 5000, seed_value: int = 1):
+    migrations.migrate(engine)
+    rng = random.Random(seed_value)
+    config = keywords.load_config()
+    departments, weights = _departments()
+    now = datetime.utcnow()
+    Task, Response = models.Task, models.Response
+    db = SessionLocal()
+    started = time.perf_counter()
+    try:
+        for start in range(0, tasks, batch):
+            count = min(batch, tasks - start)
+            rows = [_task_row(rng, now, departments, weights, config, days) for _ in range(count)]
+            for row, code in zip(rows, codes.allocate_codes(db, count)):
+                row["code"] = code
+            ids = db.execute(
+                insert(Task.__table__).returning(Task.id, sort_by_parameter_order=True), rows
+            ).scalars().all()
+
+            replies = []
+            for task_id, row in zip(ids, rows):
+                # Ответов больше у закрытых задач
+                expected = responses * (1.6 if row["status"] == models.StatusEnum.done else 0.4)
+                for n in range(int(expected) + (rng.random() < expected % 1)):
+                    replies.append({
+                        "request_id": task_id,
+                        "text": f"Ответ №{n + 1}: заявка передана в службу",
+                        "sent_by": "Модератор",
+                        "sent_at": row["created_at"] + timedelta(hours=rng.randint(1, 48)),
+                    })
+            if replies:
+                db.execute(insert(Response.__table__), replies)
+            db.commit()
+        stats.reconcile(db)
+        total = db.query(func.count(Task.id)).scalar()
+    finally:
+        db.close()
+    return {"seeded": tasks, "total_tasks": total, "seconds": round(time.perf_counter() - started, 1)}
+
+
+# Подсчёт SQL-запросов на запрос: счётчик в contextvar, его видят и greenlet асинхронной
+# сессии, и потоки пула (контекст копируется), но не фоновые задачи приложения
+_sql_counter = contextvars.ContextVar("bench_sql_counter", default=None)
+
+
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    counter = _sql_counter.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+def _install_sql_counter():
+    for target in (engine, async_engine.sync_engine):
+        if not event.contains(target, "before_cursor_execute", _count_statement):
+            event.listen(target, "before_cursor_execute", _count_statement)
+
+
+def _sample(size: int = 2000):
+    db = SessionLocal()
+    try:
+        rows = db.execute(
+            select(models.Task.id, models.Task.code, models.Task.telegram_id)
+            .order_by(func.random()).limit(size)
+        ).all()
+    finally:
+        db.close()
+    if not rows:
+        raise SystemExit("database is empty, run: python -m backend.bench.load seed")
+    return rows
+
+
+def _requests_for(name: str, rng, sample, config, departments):
+    statuses = [status.value for status in models.StatusEnum]
+    with_chat = [row for row in sample if row.telegram_id] or sample
+    deadline = (datetime.utcnow() + timedelta(days=7)).isoformat()
+    if name == "create":
+        return "POST", "/tasks", {"json": {"content": _text(rng, config), "deadline": deadline,
+                                           "telegram_id": str(rng.randrange(10 ** 9))}}
+    if name == "list":
+        return "GET", "/tasks", {"params": {"limit": 50}}
+    if name == "list_filtered":
+        return "GET", "/tasks", {"params": {"limit": 50, "department": rng.choice(departments),
+                                            "status": rng.choice(statuses)}}
+    if name == "code":
+        return "GET", f"/tasks/code/{rng.choice(sample).code}", {}
+    if name == "update":
+        return "PUT", f"/tasks/{rng.choice(sample).id}", {"json": {"status": rng.choice(statuses)}}
+    if name == "stats":
+        return "GET", "/stats", {}
+    if name == "stats_full":
+        return "GET", "/stats/full", {}
+    if name == "report":
+        return "GET", "/stats/report", {"params": {"department": rng.choice(departments)}}
+    if name == "reply":
+        return "POST", f"/tasks/{rng.choice(with_chat).id}/reply", {"json": "Спасибо, заявка выполнена"}
+    raise ValueError(name)
+
+
+async def _drive(client, name, count, concurrency, rng, sample, config, count_sql):
+    latencies, queries, errors = [], [], 0
+    departments, _ = _departments()
+    plan = iter([_requests_for(name, rng, sample, config, departments) for _ in range(count)])
+
+    async def worker():
+        nonlocal errors
+        for method, path, kwargs in plan:
+            counter = [0]
+            token = _sql_counter.set(counter) if count_sql else None
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, **kwargs)
+                errors += response.status_code >= 400
+            except httpx.HTTPError:
+                errors += 1
+            finally:
+                latencies.append((time.perf_counter() - start) * 1000)
+                if token is not None:
+                    _sql_counter.reset(token)
+            queries.append(counter[0])
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    result = {
+        "requests": count,
+        "rps": round(count / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.5), 2),
+        "p95_ms": round(percentile(latencies, 0.95), 2),
+        "p99_ms": round(percentile(latencies, 0.99), 2),
+        "errors": errors,
+    }
+    if count_sql:
+        result["sql_per_request"] = round(sum(queries) / len(queries), 2)
+        result["sql_max"] = max(queries)
+    return result
+
+
+async def _run(url, scenarios, requests, concurrency, seed_value):
+    rng = random.Random(seed_value)
+    config = keywords.load_config()
+    sample = _sample()
+    result = {}
+    if url:
+        async with httpx.AsyncClient(base_url=url, timeout=60) as client:
+            for name in scenarios:
+                count = max(1, requests // 10) if name == "report" else requests
+                result[name] = await _drive(client, name, count, concurrency, rng, sample, config, False)
+        return result
+
+    from backend.app import main, outbox
+    fake = outbox.FakeSender()
+    outbox.set_sender(fake)
+    _install_sql_counter()
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app, raise_app_exceptions=False)  # 500 — в errors
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            for name in scenarios:
+                count = max(1, requests // 10) if name == "report" else requests
+                await _drive(client, name, min(count, 20), concurrency, rng, sample, config, False)  # прогрев
+                result[name] = await _drive(client, name, count, concurrency, rng, sample, config, True)
+        if "reply" in scenarios:
+            await asyncio.sleep(2)  # диспетчер outbox успевает разослать хвост
+            result["reply"]["delivered"] = len(fake.sent)
+    return result
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(url=None, scenarios=SCENARIOS, requests: int = 500, concurrency: int = 16, seed_value: int = 2):
+    db = SessionLocal()
+    try:
+        tasks = db.query(func.count(models.Task.id)).scalar()
+    finally:
+        db.close()
+    report = {
+        "started_at": datetime.utcnow().isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "mode": "http" if url else "in-process",
+        "database": engine.dialect.name,
+        "tasks": tasks,
+        "concurrency": concurrency,
+        "scenarios": asyncio.run(_run(url, scenarios, requests, concurrency, seed_value)),
+    }
+    return report
+
+
+# Сравнение двух отчётов: отношение after/before по rps и p99 для каждого сценария
+def compare(before: dict, after: dict):
+    diff = {}
+    for name, new in after["scenarios"].items():
+        old = before["scenarios"].get(name)
+        if not old:
+            continue
+        diff[name] = {
+            "rps": f"{old['rps']} -> {new['rps']} ({new['rps'] / old['rps']:.2f}x)" if old["rps"] else None,
+            "p99_ms": f"{old['p99_ms']} -> {new['p99_ms']} ({new['p99_ms'] / old['p99_ms']:.2f}x)"
+            if old["p99_ms"] else None,
+            "sql_per_request": [old.get("sql_per_request"), new.get("sql_per_request")],
+            "errors": [old["errors"], new["errors"]],
+        }
+    return diff
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="API load test")
+    sub = parser.add_subparsers(dest="command", required=True)
+    seed_cmd = sub.add_parser("seed", help="fill the database from DATABASE_URL with synthetic tasks")
+    seed_cmd.add_argument("--tasks", type=parse_count, default=parse_count("10k"), help="e.g. 10k, 100k, 1m")
+    seed_cmd.add_argument("--responses", type=float, default=0.5, help="average responses per task")
+    seed_cmd.add_argument("--days", type=int, default=180, help="spread of created_at into the past")
+    seed_cmd.add_argument("--batch", type=int, default=5000)
+    run_cmd = sub.add_parser("run", help="drive the endpoints and print a JSON report")
+    run_cmd.add_argument("--url", help="running server; in-process ASGI app if omitted")
+    run_cmd.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    run_cmd.add_argument("--requests", type=int, default=500, help="per scenario (report: a tenth)")
+    run_cmd.add_argument("--concurrency", type=int, default=16)
+    run_cmd.add_argument("--out", help="also write the report to this file")
+    compare_cmd = sub.add_parser("compare", help="compare two run reports")
+    compare_cmd.add_argument("before")
+    compare_cmd.add_argument("after")
+    args = parser.parse_args()
+
+    if args.command == "seed":
+        output = seed(args.tasks, args.responses, args.days, args.batch)
+    elif args.command == "run":
+        output = run(args.url, args.scenarios, args.requests, args.concurrency)
+        if args.out:
+            with open(args.out, "w", encoding="utf-8") as f:
+                json.dump(output, f, ensure_ascii=False, indent=2)
+    else:
+        with open(args.before, encoding="utf-8") as f, open(args.after, encoding="utf-8") as g:
+            output = compare(json.load(f), json.load(g))
+    print(json.dumps(output, ensure_ascii=False, indent=2))
@@ -0,0 +1,98 @@
+import argparse
+import sys
+from datetime import datetime
+from sqlalchemy import func, select
+from backend.app import crud, migrations, models, schemas
+from backend.app.database import engine
+from .load import parse_count, seed
+
+# Проверка планов горячих запросов: на заполненной базе ни один из них не должен читать
+# tasks или responses последовательным сканированием. Код выхода 1 — есть seq scan (для CI).
+# Запросы собраны так же, как в crud; EXPLAIN (Postgres) / EXPLAIN QUERY PLAN (SQLite).
+#   python -m backend.bench.plans [--seed 200k] [--min-rows 50k]
+
+TABLES = ("tasks", "responses")
+
+
+def _sql(statement) -> str:
+    return str(statement.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True}))
+
+
+def hot_queries(conn):
+    Task, Response = models.Task, models.Response
+    now = datetime.utcnow()
+    sample = conn.execute(
+        select(Task.id, Task.code, Task.department, Task.created_at, Task.updated_at, Task.version)
+        .order_by(Task.created_at.desc(), Task.id.desc()).limit(1).offset(100)
+    ).one()
+    telegram_id = conn.scalar(select(Task.telegram_id).where(Task.telegram_id.is_not(None)).limit(1))
+    newest = crud._select_fields(Task, crud.SUMMARY_FIELDS).order_by(Task.created_at.desc(), Task.id.desc())
+
+    def listing(**filters):
+        return crud._filter_tasks(newest, schemas.TaskFilter(**filters)).limit(51)
+
+    ids = list(conn.scalars(select(Task.id).order_by(Task.created_at.desc(), Task.id.desc()).limit(50)))
+    return {
+        "list": listing(),
+        "list_next_page": newest.where(crud._older_than((sample.created_at, sample.id))).limit(51),
+        "list_department_status": listing(department=sample.department, status=models.StatusEnum.in_progress),
+        "list_telegram_id": listing(telegram_id=telegram_id or "0"),
+        "responses_for_page": crud._select_fields(Response, crud.RESPONSE_FIELDS)
+        .where(Response.request_id.in_(ids)).order_by(Response.id),
+        "by_code": select(Task.id).where(Task.code == sample.code),
+        "overdue_sweep": select(Task.id).where(Task.status == models.StatusEnum.in_progress, Task.deadline < now),
+        "changes_since": crud._select_fields(Task, crud.SUMMARY_FIELDS)
+        .where(Task.version > sample.version).order_by(Task.version, Task.id).limit(501),
+    }
+
+
+def explain(conn, statement):
+    sql = _sql(statement)
+    if engine.dialect.name == "postgresql":
+        return [row[0] for row in conn.exec_driver_sql("EXPLAIN " + sql)]
+    return [row[-1] for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + sql)]
+
+
+def seq_scans(plan):
+    found = []
+    for line in plan:
+        for table in TABLES:
+            if f"Seq Scan on {table}" in line:  # Postgres
+                found.append(table)
+            elif line.startswith(f"SCAN {table}") and "USING" not in line:  # SQLite
+                found.append(table)
+    return found
+
+
+def run(min_rows: int):
+    with engine.connect() as conn:
+        rows = conn.scalar(select(func.count(models.Task.id)))
+        if rows < min_rows:
+            sys.exit(f"tasks has {rows} rows, need at least {min_rows}: run with --seed")
+        if engine.dialect.name == "postgresql":
+            conn.exec_driver_sql("ANALYZE tasks")
+            conn.exec_driver_sql("ANALYZE responses")
+        else:
+            conn.exec_driver_sql("ANALYZE")
+        failed = []
+        for name, statement in hot_queries(conn).items():
+            plan = explain(conn, statement)
+            scans = seq_scans(plan)
+            print(f"{'FAIL' if scans else 'ok  '}  {name}")
+            for line in plan:
+                print(f"        {line}")
+            if scans:
+                failed.append(name)
+    print(f"{rows} tasks, {len(failed)} hot quer{'y' if len(failed) == 1 else 'ies'} with a sequential scan")
+    return failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fail if a hot query plans a sequential scan")
+    parser.add_argument("--seed", type=parse_count, default=0, help="seed this many tasks first")
+    parser.add_argument("--min-rows", type=parse_count, default=50_000)
+    args = parser.parse_args()
+    migrations.migrate(engine)
+    if args.seed:
+        print(seed(args.seed))
+    sys.exit(1 if run(args.min_rows) else 0)
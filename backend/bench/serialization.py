@@ -0,0 +1,113 @@
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from backend.app import crud, fastjson, models, schemas
+from .classifier import NOISE
+
+# Микробенчмарк сериализации списка задач: прежний путь (ORM-объекты -> pydantic с from_attributes
+# -> jsonable_encoder -> JSONResponse) против строк из кортежей колонок + fastjson.
+# Заодно проверяет, что ответы совпадают побайтно.
+#   python -m backend.bench.serialization [--rows 10000 100000] [--responses 2]
+
+
+def synthetic_rows(n: int, responses: int, seed: int = 1):
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1)
+    statuses, types = list(models.StatusEnum), list(models.RequestType)
+    rows, next_response = [], 1
+    for i in range(n):
+        created = start + timedelta(seconds=rng.randrange(10 ** 7), microseconds=rng.randrange(10 ** 6))
+        row = {
+            "id": i + 1,
+            "code": f"FM-2025-{10000 + i}",
+            "content": " ".join(rng.sample(NOISE, 8)),
+            "department": rng.choice(["ЖКХ", "Отдел транспорта", "Экология"]),
+            "status": rng.choice(statuses),
+            "type": rng.choice(types),
+            "created_at": created,
+            "updated_at": created + timedelta(hours=rng.randrange(48)),
+            "deadline": created + timedelta(days=7),
+            "telegram_id": str(rng.randrange(10 ** 9)) if rng.random() < 0.5 else None,
+            "username": None,
+            "full_name": None,
+            "reply": "Спасибо, передали в службу" if rng.random() < 0.3 else None,
+            "parent_id": None,
+        }
+        row["responses"] = []
+        for _ in range(responses):
+            row["responses"].append({
+                "id": next_response, "request_id": row["id"], "text": "Заявка принята в работу",
+                "sent_by": "Модератор", "sent_at": created + timedelta(hours=1),
+            })
+            next_response += 1
+        rows.append(row)
+    return rows
+
+
+def _orm_like(row):
+    # Стоит вместо ORM-объекта: pydantic читает атрибуты так же (from_attributes)
+    return SimpleNamespace(**{**row, "responses": [SimpleNamespace(**r) for r in row["responses"]]})
+
+
+def _timed(fn, repeat: int):
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def run_case(rows, full: bool, repeat: int):
+    fields = crud.FULL_FIELDS if full else crud.SUMMARY_FIELDS
+    objects = [_orm_like(row) for row in rows]
+    tuples = [tuple(row[name] for name in fields) for row in rows]  # как из db.execute(select(...))
+    page_model = schemas.TaskPage if full else schemas.TaskSummaryPage
+
+    def pydantic_path():
+        page = page_model(items=objects, next_cursor=None)
+        return JSONResponse(jsonable_encoder(page)).body
+
+    def fast_path():
+        items = [dict(zip(fields, row)) for row in tuples]
+        if full:
+            for item, row in zip(items, rows):
+                item["responses"] = [dict(zip(crud.RESPONSE_FIELDS, r.values())) for r in row["responses"]]
+        return fastjson.FastJSONResponse({"items": items, "next_cursor": None}).body
+
+    old_ms, old_body = _timed(pydantic_path, repeat)
+    new_ms, new_body = _timed(fast_path, repeat)
+    if old_body != new_body:
+        raise AssertionError("fast path output differs from the pydantic path")
+    return {
+        "bytes": len(new_body),
+        "pydantic_ms": round(old_ms, 1),
+        "fast_ms": round(new_ms, 1),
+        "speedup": round(old_ms / new_ms, 1),
+    }
+
+
+def run(sizes, responses: int, repeat: int):
+    result = {"encoder": "orjson" if fastjson.orjson is not None else "json"}
+    for n in sizes:
+        rows = synthetic_rows(n, responses)
+        result[str(n)] = {
+            "summary": run_case(rows, full=False, repeat=repeat),
+            "with_responses": run_case(rows, full=True, repeat=repeat),
+        }
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="List serialization benchmark")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--responses", type=int, default=2, help="responses per task for include=responses")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    print(json.dumps(run(args.rows, args.responses, args.repeat), indent=2))
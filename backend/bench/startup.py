@@ -0,0 +1,102 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Время старта приложения в отдельном процессе: импорт backend.app.main, lifespan (миграции, лента
+# событий) и первый запрос GET /tasks. Прогон завершается с кодом 1, если импорт подтянул
+# тяжёлые необязательные модули или открыл соединение с БД, либо медианы превысили пороги.
+#   python -m backend.bench.startup [--repeat 5] [--max-import-ms 1500] [--max-first-request-ms 3000]
+# Без DATABASE_URL — свежая SQLite во временном каталоге (миграции с нуля при каждом прогоне).
+
+HEAVY_MODULES = ("fpdf", "telegram", "Cython")
+
+_CHILD = r"""
+import asyncio, json, sys, time
+started = time.perf_counter()
+from backend.app import main, database
+imported = time.perf_counter()
+heavy = [name for name in HEAVY_MODULES if name in sys.modules]
+connections = database.engine.pool.checkedin() + database.engine.pool.checkedout()
+
+async def first_request():
+    import httpx
+    async with main.app.router.lifespan_context(main.app):
+        ready = time.perf_counter()
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            response = await client.get("/tasks", params={"limit": 1})
+        return ready, time.perf_counter(), response.status_code
+
+ready, answered, status = asyncio.run(first_request())
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "startup_ms": (ready - imported) * 1000,
+    "first_request_ms": (answered - started) * 1000,
+    "status": status,
+    "heavy_modules": heavy,
+    "connections_at_import": connections,
+}))
+"""
+
+
+def measure_once(database_url: str = None):
+    env = dict(os.environ, OVERDUE_SWEEP_INTERVAL="0", OUTBOX_POLL_INTERVAL="0", ARCHIVE_INTERVAL="0")
+    with tempfile.TemporaryDirectory() as tmp:
+        env["DATABASE_URL"] = database_url or f"sqlite:///{tmp}/startup.db"
+        code = f"HEAVY_MODULES = {HEAVY_MODULES!r}\n" + _CHILD
+        started = time.perf_counter()
+        out = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True)
+        process_ms = (time.perf_counter() - started) * 1000
+    if out.returncode != 0:
+        raise RuntimeError(out.stderr.strip().splitlines()[-1] if out.stderr.strip() else "startup failed")
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    result["process_ms"] = process_ms
+    return result
+
+
+def run(repeat: int, database_url: str = None):
+    runs = [measure_once(database_url) for _ in range(repeat)]
+    summary = {
+        key: round(statistics.median(r[key] for r in runs), 1)
+        for key in ("import_ms", "startup_ms", "first_request_ms", "process_ms")
+    }
+    summary["runs"] = repeat
+    summary["status"] = sorted({r["status"] for r in runs})
+    summary["heavy_modules"] = sorted({name for r in runs for name in r["heavy_modules"]})
+    summary["connections_at_import"] = max(r["connections_at_import"] for r in runs)
+    return summary
+
+
+def check(summary, max_import_ms: float = None, max_first_request_ms: float = None):
+    problems = []
+    if summary["heavy_modules"]:
+        problems.append(f"imported at startup: {', '.join(summary['heavy_modules'])}")
+    if summary["connections_at_import"]:
+        problems.append("importing the app opened a database connection")
+    if summary["status"] != [200]:
+        problems.append(f"first request returned {summary['status']}")
+    if max_import_ms and summary["import_ms"] > max_import_ms:
+        problems.append(f"import {summary['import_ms']} ms > {max_import_ms} ms")
+    if max_first_request_ms and summary["first_request_ms"] > max_first_request_ms:
+        problems.append(f"first request {summary['first_request_ms']} ms > {max_first_request_ms} ms")
+    return problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="App import and time-to-first-request benchmark")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--database-url", help="default: a fresh SQLite file per run")
+    parser.add_argument("--max-import-ms", type=float)
+    parser.add_argument("--max-first-request-ms", type=float)
+    args = parser.parse_args()
+    summary = run(args.repeat, args.database_url)
+    print(json.dumps(summary, indent=2))
+    problems = check(summary, args.max_import_ms, args.max_first_request_ms)
+    for problem in problems:
+        print("FAIL:", problem)
+    sys.exit(1 if problems else 0)
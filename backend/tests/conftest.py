@@ -0,0 +1,35 @@
+import os
+import tempfile
+import pytest
+
+# Тесты идут на временной SQLite-базе: переменные окружения задаются до импорта backend.app
+_tmp = tempfile.mkdtemp(prefix="backend-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp}/test.db"
+os.environ["DEDUP_ENABLED"] = "1"
+
+# Таблицы, которые не очищаются между тестами: версии миграций и счётчик кодов
+# (аллокатор держит выданный блок в памяти — сброс счётчика повторил бы номера)
+_KEEP = {"schema_migrations", "code_counters"}
+
+
+@pytest.fixture(scope="session")
+def engine():
+    from backend.app import migrations
+    from backend.app.database import engine
+    migrations.migrate(engine)
+    return engine
+
+
+@pytest.fixture
+def db(engine):
+    from backend.app import models
+    from backend.app.cache import code_cache
+    from backend.app.database import SessionLocal
+    with engine.begin() as conn:
+        for table in reversed(models.Base.metadata.sorted_tables):
+            if table.name not in _KEEP:
+                conn.execute(table.delete())
+    code_cache.clear()
+    session = SessionLocal()
+    yield session
+    session.close()
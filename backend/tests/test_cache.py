@@ -0,0 +1,23 @@
+from backend.app.cache import TTLCache
+
+
+def test_set_after_invalidate_is_dropped():
+    cache = TTLCache()
+    generation = cache.generation("FM-1")
+    cache.invalidate("FM-1")  # задачу изменили, пока читатель ходил в БД
+    cache.set("FM-1", "old", generation)
+    assert cache.get("FM-1") is None
+    cache.set("FM-1", "new", cache.generation("FM-1"))
+    assert cache.get("FM-1") == "new"
+
+
+def test_other_keys_and_evicted_invalidations():
+    cache = TTLCache(max_entries=2)
+    generation = cache.generation("a")
+    cache.invalidate("b")
+    cache.set("a", 1, generation)
+    assert cache.get("a") == 1
+    for key in ("c", "d", "e"):  # сброс "b" вытеснен — порог не пускает устаревшее значение
+        cache.invalidate(key)
+    cache.set("b", 2, generation)
+    assert cache.get("b") is None
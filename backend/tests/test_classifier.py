@@ -0,0 +1,20 @@
+import json
+import logging
+from backend.app import classifier, keywords
+
+
+def test_corrupt_model_falls_back_to_keywords(tmp_path, monkeypatch, caplog):
+    (tmp_path / "meta.json").write_text(json.dumps({"labels": ["ЖКХ"]}))
+    (tmp_path / "weights.npy").write_bytes(b"not a numpy file")
+    monkeypatch.setattr(classifier, "CLASSIFIER_MODEL_DIR", str(tmp_path))
+    monkeypatch.setattr(classifier, "_model", None)
+    monkeypatch.setattr(classifier, "_loaded", False)
+
+    with caplog.at_level(logging.INFO, logger=classifier.__name__):
+        texts = ["что-то непонятное", "ещё одно"]
+        assert classifier.match_departments(texts) == [keywords.default_department()] * 2
+        classifier.match_departments(texts)
+        classifier.log_backend()
+    failures = [record for record in caplog.records if record.levelno == logging.ERROR]
+    assert len(failures) == 1 and failures[0].exc_info
+    assert caplog.records[-1].getMessage() == "Department classifier: keywords only"
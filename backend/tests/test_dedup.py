@@ -0,0 +1,116 @@
+from datetime import datetime, timedelta
+from backend.app import crud, dedup, models, schemas, stats
+
+DEADLINE = datetime.utcnow() + timedelta(days=3)
+LAMP = "Не горит фонарь возле дома 12 на улице Абая, вечером очень темно"
+PIT = "Огромная яма на проезжей части у школы номер 5, машины объезжают по встречке"
+
+
+def create(db, content, telegram_id=None):
+    return crud.create_task(db, schemas.TaskCreate(content=content, deadline=DEADLINE, telegram_id=telegram_id))
+
+
+def test_signature_similarity():
+    lamp = dedup.signature(LAMP)
+    assert dedup.similarity(lamp, dedup.signature(LAMP + "!!")) == 1.0
+    assert dedup.similarity(lamp, dedup.signature(LAMP.replace(" очень", ""))) >= dedup.DEDUP_THRESHOLD
+    assert dedup.similarity(lamp, dedup.signature(PIT)) < dedup.DEDUP_THRESHOLD
+    assert dedup.signature("ок") is None
+
+
+def test_signature_ignores_topic_and_attachments():
+    bot_text = f"[СВЕТ] {LAMP}\n📷 Фото: <a href='https://api.telegram.org/file/x/1.jpg'>Открыть</a>\n📍 Геолокация: 43.2, 76.9"
+    assert dedup.signature(bot_text) == dedup.signature(LAMP)
+
+
+def test_link_near_duplicates_to_root(db):
+    root = create(db, LAMP)
+    duplicate = create(db, LAMP + "!!")
+    rephrased = create(db, LAMP.replace(" очень", ""))
+    other = create(db, PIT)
+    assert root.parent_id is None
+    assert (duplicate.parent_id, rephrased.parent_id) == (root.id, root.id)
+    assert other.parent_id is None
+    # В индексе только корни
+    indexed = {task_id for task_id, in db.query(models.TaskSignature.task_id)}
+    assert indexed == {root.id, other.id}
+
+
+def test_bulk_links_within_batch(db):
+    created = crud.create_tasks_bulk(db, [
+        schemas.TaskCreate(content=text, deadline=DEADLINE) for text in (LAMP, PIT, LAMP + "!!")
+    ])
+    parents = dict(db.query(models.Task.id, models.Task.parent_id))
+    (lamp, _), (pit, _), (duplicate, _) = created
+    assert parents == {lamp: None, pit: None, duplicate: lamp}
+
+
+def test_done_root_is_not_a_candidate(db):
+    root = create(db, LAMP)
+    crud.update_task_status(db, root.id, schemas.TaskUpdate(status=models.StatusEnum.done))
+    assert create(db, LAMP).parent_id is None
+
+
+def test_forget_detaches_duplicates(db):
+    root = create(db, LAMP)
+    duplicate = create(db, LAMP + "!!")
+    assert crud.delete_task(db, root.id)
+    db.expire_all()
+    assert db.get(models.Task, duplicate.id).parent_id is None
+    assert db.get(models.TaskTombstone, root.id) is not None
+    assert db.query(models.TaskSignature).count() == 0
+    assert db.query(models.TaskLshBucket).count() == 0
+
+
+def test_cluster_reply(db):
+    root = create(db, LAMP, telegram_id="1")
+    create(db, LAMP + "!!")
+    create(db, LAMP.replace(" очень", ""), telegram_id="2")
+    create(db, PIT, telegram_id="3")
+
+    assert crud.save_cluster_reply(db, root.id, "Бригада выехала") == {"replied": 3, "notified": 2}
+    assert sorted(chat for chat, in db.query(models.Outbox.chat_id)) == ["1", "2"]
+    replies = dict(db.query(models.Task.id, models.Task.reply))
+    assert sum(reply == "Бригада выехала" for reply in replies.values()) == 3
+    assert db.query(models.Response).count() == 3
+    assert crud.save_cluster_reply(db, 9999, "нет такой задачи") is None
+
+
+def test_cluster_listing_and_status(db):
+    root = create(db, LAMP)
+    create(db, LAMP + "!!")
+    create(db, PIT)
+
+    page = crud.get_clusters(db)
+    assert [(item["task"]["id"], item["duplicates"]) for item in page["items"]] == [(root.id, 1)]
+    assert page["next_offset"] is None
+
+    assert crud.update_cluster_status(db, root.id, models.StatusEnum.done) == {"updated": 2}
+    assert crud.get_clusters(db, status=models.StatusEnum.in_progress)["items"] == []
+    assert stats.reconcile(db) == []
+    assert crud.update_cluster_status(db, 9999, models.StatusEnum.done) is None
+
+
+def test_prune_drops_signatures_outside_window(db):
+    create(db, LAMP)
+    assert dedup.prune(db, datetime.utcnow()) == 0
+    assert dedup.prune(db, datetime.utcnow() + timedelta(days=dedup.DEDUP_WINDOW_DAYS + 1)) == 1
+    assert db.query(models.TaskLshBucket).count() == 0
+
+
+def test_numpy_matches_pure_python(monkeypatch):
+    texts = [LAMP, PIT, "ок", LAMP + " и ещё " + PIT]
+    vectorized = dedup.signatures(texts, enabled=True)
+    monkeypatch.setattr(dedup, "_np", False)
+    assert dedup.signatures(texts, enabled=True) == vectorized
+    assert vectorized[2] is None
+    assert dedup.signatures(texts, enabled=False) == [None] * 4
+
+
+def test_rebuild_reindexes_roots(db):
+    root = create(db, LAMP)
+    create(db, PIT)
+    db.query(models.TaskLshBucket).delete()
+    db.commit()
+    assert dedup.rebuild(db) == 2
+    assert create(db, LAMP + "!!").parent_id == root.id
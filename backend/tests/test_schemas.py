@@ -0,0 +1,10 @@
+from datetime import datetime
+from backend.app import schemas
+
+
+def test_aware_datetimes_become_naive_utc():
+    task = schemas.TaskCreate(content="x", deadline="2030-01-01T10:00:00+05:00")
+    assert task.deadline == datetime(2030, 1, 1, 5)
+    filters = schemas.TaskFilter(created_from="2030-01-01T10:00:00Z", deadline_to="2030-01-01T10:00:00")
+    assert (filters.created_from, filters.created_to) == (datetime(2030, 1, 1, 10), None)
+    assert filters.deadline_to == datetime(2030, 1, 1, 10)
@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta
+import pytest
+from backend.app import crud, models, schemas, stats, utils, versions
+
+DEADLINE = datetime.utcnow() + timedelta(days=3)
+
+
+def create(db, content):
+    return crud.create_task(db, schemas.TaskCreate(content=content, deadline=DEADLINE))
+
+
+def ids(delta):
+    return [item["id"] for item in delta["items"]]
+
+
+def test_every_commit_gets_next_version(db):
+    first = create(db, "яма")
+    second = create(db, "фонарь")
+    assert (first.version, second.version) == (first.version, first.version + 1)
+    assert crud.get_data_version(db)[0] == second.version
+    crud.update_task_status(db, first.id, schemas.TaskUpdate(status=models.StatusEnum.done))
+    db.refresh(first)
+    assert first.version == second.version + 1
+
+
+def test_changes_page_by_version(db):
+    tasks = [create(db, f"жалоба {i}") for i in range(3)]
+    page = crud.get_changes(db, None, limit=2)
+    assert ids(page) == [tasks[0].id, tasks[1].id] and page["has_more"]
+    page = crud.get_changes(db, utils.decode_since(page["next_since"]), limit=2)
+    assert ids(page) == [tasks[2].id] and not page["has_more"]
+    since = utils.decode_since(page["next_since"])
+    assert ids(crud.get_changes(db, since)) == []
+
+    crud.update_task_status(db, tasks[0].id, schemas.TaskUpdate(status=models.StatusEnum.done))
+    assert crud.delete_task(db, tasks[1].id)
+    page = crud.get_changes(db, since)
+    assert (ids(page), page["deleted"]) == ([tasks[0].id], [tasks[1].id])
+    # Версия только с удалением тоже пройдена — следующий запрос пуст
+    page = crud.get_changes(db, utils.decode_since(page["next_since"]))
+    assert (ids(page), page["deleted"]) == ([], [])
+
+
+def test_pruned_tombstones_expire_old_tokens(db):
+    task = create(db, "яма")
+    since = utils.decode_since(crud.get_changes(db, None)["next_since"])
+    assert crud.delete_task(db, task.id)
+    assert crud.prune_tombstones(db, datetime.utcnow()) == 0
+    assert crud.prune_tombstones(db, datetime.utcnow() + timedelta(days=crud.TOMBSTONE_RETENTION_DAYS + 1)) == 1
+    with pytest.raises(crud.SyncExpired):
+        crud.get_changes(db, since)
+    assert crud.get_changes(db, None)["deleted"] == []
+
+
+def test_reconcile_bumps_version(db):
+    create(db, "яма")
+    version, _ = crud.get_data_version(db)
+    stats.reconcile(db)
+    assert crud.get_data_version(db)[0] == version + 1
+    assert versions.pruned(db) == 0
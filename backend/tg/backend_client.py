@@ -0,0 +1,44 @@
+import asyncio
+import os
+import httpx
+
+# Асинхронный клиент к backend API для обработчиков бота: один пул keep-alive соединений,
+# таймауты и ограничение числа одновременных запросов.
+BACKEND_TIMEOUT = float(os.getenv("BACKEND_TIMEOUT", "10"))
+BACKEND_MAX_CONNECTIONS = int(os.getenv("BACKEND_MAX_CONNECTIONS", "100"))
+BACKEND_MAX_CONCURRENCY = int(os.getenv("BACKEND_MAX_CONCURRENCY", "200"))
+
+
+class BackendClient:
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+        self._client = None
+        self._semaphore = asyncio.Semaphore(BACKEND_MAX_CONCURRENCY)
+
+    async def start(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=httpx.Timeout(BACKEND_TIMEOUT, connect=3.0),
+                limits=httpx.Limits(
+                    max_connections=BACKEND_MAX_CONNECTIONS,
+                    max_keepalive_connections=BACKEND_MAX_CONNECTIONS,
+                ),
+            )
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        if self._client is None:
+            await self.start()
+        async with self._semaphore:
+            return await self._client.request(method, path, **kwargs)
+
+    async def get(self, path: str, **kwargs) -> httpx.Response:
+        return await self._request("GET", path, **kwargs)
+
+    async def post(self, path: str, **kwargs) -> httpx.Response:
+        return await self._request("POST", path, **kwargs)
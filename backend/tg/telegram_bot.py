@@ -5,23 +5,26 @@ from telegram.ext import (
     ApplicationBuilder, CommandHandler, MessageHandler,
     filters, ContextTypes, ConversationHandler
 )
-import requests
 import datetime
 import os
 from dotenv import load_dotenv
+from backend.app.keywords import topic_departments
+from backend.tg.backend_client import BackendClient
+from backend.tg.update_processor import PerChatUpdateProcessor
 
 SELECT_ACTION, TOPIC, TEXT, PHOTO, LOCATION = range(5)
 
-TOPIC_TO_DEPARTMENT = {
-    "мусор": "ЖКХ",
-    "вода": "Коммунальные службы",
-    "интернет": "Цифровизация",
-    "дорога": "Отдел транспорта",
-    "освещение": "Энергетика",
-    "экология": "Экология"
-}
 
-BASE_URL = "http://localhost:8000"
+BASE_URL = os.getenv("BACKEND_URL", "http://localhost:8000")
+
+# Общий пул соединений к backend; открывается и закрывается вместе с приложением бота
+api = BackendClient(BASE_URL)
+
+async def on_startup(application):
+    await api.start()
+
+async def on_shutdown(application):
+    await api.close()
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     keyboard = [["📨 Оставить анонимно жалобу"], ["💡 Предложить идею"], ["📋 Узнать статус жалобы"]]
@@ -50,7 +53,7 @@ async def select_action(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def handle_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
     code = update.message.text.strip()
     try:
-        res = requests.get(f"{BASE_URL}/tasks/code/{code}")
+        res = await api.get(f"/tasks/code/{code}")
         if res.status_code == 200:
             task = res.json()
             msg = f"📋 Статус обращения {code}:\n\n🗂 Отдел: {task['department']}\n📄 Статус: {task['status']}\n📆 Срок: {task['deadline']}"
@@ -64,7 +67,7 @@ async def handle_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return ConversationHandler.END
 
 async def ask_topic(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    keyboard = [[t] for t in TOPIC_TO_DEPARTMENT]
+    keyboard = [[t] for t in topic_departments()]
     await update.message.reply_text(
         "Выберите тему обращения:",
         reply_markup=ReplyKeyboardMarkup(keyboard, resize_keyboard=True, one_time_keyboard=True)
@@ -73,11 +76,13 @@ async def ask_topic(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def set_topic(update: Update, context: ContextTypes.DEFAULT_TYPE):
     topic = update.message.text.lower()
-    if topic not in TOPIC_TO_DEPARTMENT:
+    # Темы берутся из общего словаря backend/app/keywords.json
+    departments = topic_departments()
+    if topic not in departments:
         await update.message.reply_text("Пожалуйста, выберите тему из списка.")
         return TOPIC
     context.user_data["topic"] = topic
-    context.user_data["department"] = TOPIC_TO_DEPARTMENT[topic]
+    context.user_data["department"] = departments[topic]
     await update.message.reply_text("✍️ Введите текст жалобы:")
     return TEXT
 
@@ -139,12 +144,14 @@ async def set_location(update: Update, context: ContextTypes.DEFAULT_TYPE):
     }
 
     try:
-        res = requests.post(f"{BASE_URL}/tasks", json=payload)
+        res = await api.post("/tasks", json=payload)
         if res.status_code == 200:
             task = res.json()
-            code = f"FM-2025-{str(task['id']).zfill(4)}"
+            code = task["code"]
+            # Похожая жалоба уже в работе — ответ по ней придёт и этому автору
+            note = "\nПохожая жалоба уже поступила, она решается вместе с вашей." if task.get("parent_id") else ""
             await update.message.reply_text(
-                f"✅ Жалоба зарегистрирована.\nНомер: {code}",
+                f"✅ Жалоба зарегистрирована.\nНомер: {code}{note}",
                 reply_markup=ReplyKeyboardMarkup([
                     ["📨 Оставить жалобу", "📋 Узнать статус"]
                 ], resize_keyboard=True, one_time_keyboard=True),
@@ -168,7 +175,15 @@ if __name__ == "__main__":
     load_dotenv()
     TOKEN = os.getenv("BOT_TOKEN")
 
-    app = ApplicationBuilder().token(TOKEN).build()
+    app = (
+        ApplicationBuilder()
+        .token(TOKEN)
+        # Чаты — параллельно, апдейты одного чата — по очереди (состояние ConversationHandler)
+        .concurrent_updates(PerChatUpdateProcessor(int(os.getenv("BOT_CONCURRENT_UPDATES", "256"))))
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+        .build()
+    )
 
     conv = ConversationHandler(
         entry_points=[CommandHandler("start", start)],
@@ -188,7 +203,7 @@ if __name__ == "__main__":
     app.add_handler(conv)
     app.add_handler(MessageHandler(filters.Regex("^📋 Узнать статус$"), select_action))
     app.add_handler(MessageHandler(filters.Regex("^📨 Оставить жалобу$"), restart))
-    app.add_handler(MessageHandler(filters.Regex("^FM-2025-[0-9]+$"), handle_status))
+    app.add_handler(MessageHandler(filters.Regex("^FM-[0-9]{4}-[0-9]+$"), handle_status))
 
     print("🚀 Бот запущен")
     app.run_polling()
@@ -0,0 +1,35 @@
+import asyncio
+from telegram.ext import BaseUpdateProcessor
+
+# Параллельная обработка апдейтов с порядком внутри чата: разные жители обслуживаются
+# одновременно (медленный ответ backend одному не задерживает остальных), а апдейты одного чата
+# идут строго по очереди — ConversationHandler не видит гонок за состояние диалога.
+# Апдейт без чата обрабатывается сразу. Ожидающий своей очереди апдейт занимает место
+# в общем лимите max_concurrent_updates.
+
+
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        self._chats = {}  # chat_id -> [asyncio.Lock, апдейтов в работе и в очереди]
+
+    async def do_process_update(self, update, coroutine):
+        chat = getattr(update, "effective_chat", None)
+        if chat is None:
+            await coroutine
+            return
+        entry = self._chats.setdefault(chat.id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                await coroutine
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._chats[chat.id]
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
@@ -1,8 +1,9 @@
-import React, { useEffect, useState } from 'react';
+import React, { useEffect, useRef, useState } from 'react';
 import axios from 'axios';
 import { BarChart, Bar, XAxis, YAxis, CartesianGrid, Tooltip, ResponsiveContainer } from 'recharts';
 
 const API_URL = 'http://localhost:8000/tasks';
+const POLL_INTERVAL = 10000;
 
 const statusColors = {
   'в процессе': 'bg-yellow-100 text-yellow-800',
@@ -15,11 +16,38 @@ function App() {
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
 
-  // Получение задач
+  // Дельта-синхронизация: первый запрос since=0 забирает всё, дальше — только изменения.
+  // If-None-Match: пока данные не менялись, сервер отвечает 304 без тела.
+  const sync = useRef({ since: '0', etag: null });
+
+  const applyDelta = (prev, delta) => {
+    const byId = new Map(prev.map(task => [task.id, task]));
+    delta.deleted.forEach(id => byId.delete(id));
+    delta.items.forEach(task => byId.set(task.id, task));
+    return [...byId.values()].sort((a, b) => b.created_at.localeCompare(a.created_at) || b.id - a.id);
+  };
+
   const fetchTasks = async () => {
     try {
-      const res = await axios.get(API_URL);
-      setTasks(res.data);
+      let hasMore = true;
+      while (hasMore) {
+        const { since, etag } = sync.current;
+        const res = await axios.get(API_URL, {
+          params: { since, limit: 500 },
+          headers: etag ? { 'If-None-Match': etag } : {},
+          validateStatus: status => status === 200 || status === 304 || status === 410,
+        });
+        if (res.status === 304) break;
+        if (res.status === 410) {  // токен устарел — полная перезагрузка
+          sync.current = { since: '0', etag: null };
+          setTasks([]);
+          continue;
+        }
+        const delta = res.data;
+        sync.current = { since: delta.next_since, etag: delta.has_more ? null : res.headers.etag };
+        setTasks(prev => applyDelta(prev, delta));
+        hasMore = delta.has_more;
+      }
       setLoading(false);
     } catch (err) {
       setError('Ошибка при загрузке данных');
@@ -29,6 +57,8 @@ function App() {
 
   useEffect(() => {
     fetchTasks();
+    const timer = setInterval(fetchTasks, POLL_INTERVAL);
+    return () => clearInterval(timer);
   }, []);
 
   // Удаление задачи с подтверждением